@@ -0,0 +1,115 @@
+'''
+Measure how the simulation scales with agent count, obstacle count, terrain size and tick count
+
+    python benchmark.py --agents 10 100 1000 --obstacles 10 1000 --sizes 20x50 200x5000 --ticks 200 --output bench.json
+
+Every combination runs on a fixed-seed scenario so results are comparable between versions.
+'''
+import sys
+import json
+import argparse
+import platform
+import tracemalloc
+import numpy as np
+from swarm.terrain import Terrain, random_obstacles
+from swarm.simulation import Simulation
+from swarm.instrumentation import Instrumentation, AggregateSink
+
+
+PHASES = ['sense', 'distress', 'translate']
+
+
+def build_simulation(agents: int, obstacles: int, width: float, height: float, seed: int, instrumentation: Instrumentation = None) -> Simulation:
+    rng = np.random.default_rng(seed)
+    terrain = Terrain(width, height, random_obstacles(obstacles, width, height, rng), rng=rng, agent_count=agents)
+    return Simulation(terrain, instrumentation=instrumentation)
+
+
+def time_run(simulation: Simulation, ticks: int) -> dict:
+    '''
+    Step an instrumented simulation -> {phase: seconds}
+    '''
+    simulation.run(ticks)
+    aggregate, = [sink for sink in simulation.instrumentation.sinks if isinstance(sink, AggregateSink)]
+    return {phase: aggregate.phase_seconds.get(phase, 0.0) for phase in PHASES}
+
+
+def peak_memory(agents: int, obstacles: int, width: float, height: float, ticks: int, seed: int) -> int:
+    '''
+    Peak bytes allocated while building and running a scenario. Measured in a separate run as tracing slows it down
+    '''
+    tracemalloc.start()
+    try:
+        build_simulation(agents, obstacles, width, height, seed).run(ticks)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark(agents: int, obstacles: int, width: float, height: float, ticks: int, seed: int, repeats: int, measure_memory: bool) -> dict:
+    '''
+    Benchmark one scenario, keeping the fastest of the repeats
+    '''
+    best = None
+    for _ in range(repeats):
+        simulation = build_simulation(agents, obstacles, width, height, seed, Instrumentation([AggregateSink()]))
+        phase_times = time_run(simulation, ticks)
+        if best is None or sum(phase_times.values()) < sum(best.values()):
+            best = phase_times
+    total = sum(best.values())
+    return {
+        'agents': agents,
+        'obstacles': obstacles,
+        'width': width,
+        'height': height,
+        'ticks': ticks,
+        'seed': seed,
+        'seconds': total,
+        'ticks_per_second': ticks / total if total else float('inf'),
+        'phase_seconds': best,
+        'peak_memory_bytes': peak_memory(agents, obstacles, width, height, ticks, seed) if measure_memory else None,
+    }
+
+
+def parse_size(size: str) -> tuple:
+    width, height = size.lower().split('x')
+    return float(width), float(height)
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agents', type=int, nargs='+', default=[5, 50, 500])
+    parser.add_argument('--obstacles', type=int, nargs='+', default=[2, 200])
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[(20.0, 50.0)], help='terrain sizes as WIDTHxHEIGHT')
+    parser.add_argument('--ticks', type=int, nargs='+', default=[200])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3, help='runs per scenario, the fastest is reported')
+    parser.add_argument('--no-memory', action='store_true', help='skip the traced run that measures peak memory')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for width, height in args.sizes:
+        for agents in args.agents:
+            for obstacles in args.obstacles:
+                for ticks in args.ticks:
+                    result = benchmark(agents, obstacles, width, height, ticks, args.seed, args.repeats, not args.no_memory)
+                    results.append(result)
+                    print(f"{width:g}x{height:g} agents={agents} obstacles={obstacles} ticks={ticks}: "
+                          f"{result['ticks_per_second']:.1f} ticks/s "
+                          + ' '.join(f'{phase}={seconds:.3f}s' for phase, seconds in result['phase_seconds'].items())
+                          + (f" peak={result['peak_memory_bytes'] / 2 ** 20:.1f}MiB" if result['peak_memory_bytes'] is not None else ''),
+                          file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'results': results,
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
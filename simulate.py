@@ -1,7 +1,14 @@
+import numpy as np
 from swarm.terrain import Terrain
+from swarm.simulation import Simulation
+from swarm.renderer import render_video
 
-obstacles = [(16, 10, 4, 5), (0, 35, 10, 7)]
-terrain = Terrain(20, 50, obstacles)
-# terrain.tester()
-# terrain.plot_terrain()
-terrain.animate()
\ No newline at end of file
+if __name__ == '__main__':
+    obstacles = [(16, 10, 4, 5), (0, 35, 10, 7)]
+    terrain = Terrain(20, 50, obstacles)
+    simulation = Simulation(terrain)
+    positions = []
+    for _ in range(200):
+        simulation.step()
+        positions.append(terrain.swarm.positions.copy())
+    render_video('output/swarm-control.mp4', np.array(positions), terrain.width, terrain.height, list(terrain.obstacles.values()))
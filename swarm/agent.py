@@ -1,38 +1,100 @@
 import numpy as np
 import config as cf
 # from terrain import Terrain
+from swarm.state import DIRECTIVE_STATES
+from swarm.holes import HoleTable
 from util.exceptions import VelocityDirectionError
 
 class Agent:
     '''
-    A member agent of a swarm
+    A member agent of a swarm. Its data lives in row id of the swarm arrays, which start out with the agent
+    translating forward at nominal velocity
     '''
     def __init__(self, id: int, terrain):
         self.id = id
         self.terrain = terrain
-        self.titter = cf.NOMINAL_TITTER # degrees
-        self.position = np.random.randint(2, terrain.width - 2), np.random.randint(2, 5)
-        self.velocity = cf.NOMINAL_VELOCITY
-        self.can_sense = True
-        self.halted = False
-        self.state = cf.FORWARD_TRANSLATION
-        self.safety_position = 0
-
-    def sense(self):
+        self.swarm = terrain.swarm # row self.id of the swarm arrays holds this agent's data
+        self.params = terrain.params
+
+    @property
+    def position(self) -> tuple:
+        return tuple(self.swarm.positions[self.id])
+
+    @position.setter
+    def position(self, position: tuple):
+        self.swarm.positions[self.id] = position
+
+    @property
+    def velocity(self) -> float:
+        return self.swarm.velocities[self.id]
+
+    @velocity.setter
+    def velocity(self, velocity: float):
+        self.swarm.velocities[self.id] = velocity
+
+    @property
+    def titter(self) -> float:
+        return self.swarm.titters[self.id]
+
+    @titter.setter
+    def titter(self, titter: float):
+        self.swarm.titters[self.id] = titter
+
+    @property
+    def state(self) -> int:
+        return self.swarm.states[self.id]
+
+    @state.setter
+    def state(self, state: int):
+        self.swarm.states[self.id] = state
+
+    @property
+    def halted(self) -> bool:
+        return self.swarm.halted[self.id]
+
+    @halted.setter
+    def halted(self, halted: bool):
+        self.swarm.halted[self.id] = halted
+
+    @property
+    def can_sense(self) -> bool:
+        return self.swarm.can_sense[self.id]
+
+    @can_sense.setter
+    def can_sense(self, can_sense: bool):
+        self.swarm.can_sense[self.id] = can_sense
+
+    @property
+    def safety_position(self):
+        '''The safety point the agent is headed to or 0 if it has none'''
+        if not self.swarm.has_safety[self.id]:
+            return 0
+        return tuple(self.swarm.safety_positions[self.id])
+
+    @safety_position.setter
+    def safety_position(self, safety_position):
+        if isinstance(safety_position, tuple):
+            self.swarm.safety_positions[self.id] = safety_position
+            self.swarm.has_safety[self.id] = True
+        else:
+            self.swarm.has_safety[self.id] = False
+
+    def sense(self, comply: bool = True, blocking_obstacle_ids: list = None) -> dict:
         '''
-        Scan the terrain for obstacles and wait for the swarm to decide on a directive
+        Scan the terrain for obstacles and wait for the swarm to decide on a directive. Returns the directive, which is
+        empty if a distress signal went out on the message bus and the directive is still to come
+
+        blocking_obstacle_ids can be passed in when the terrain's obstacle index was already queried for this agent
         '''
         # remember to sense before translating
         # remember that agent velocity is the resultant
 
         if self.can_sense:
-            blocking_obstacles = []
-            for obstacle in self.terrain.obstacles:
-                if np.abs(self.position[1] - obstacle[1]) <= cf.OBSTACLE_PANIC_ACT_DISTANCE and self.position[0] > obstacle[0] - cf.AGENT_RADIUS  and self.position[0] < obstacle[0] + obstacle[2] + cf.AGENT_RADIUS:
-                    blocking_obstacles.append(obstacle)
+            if blocking_obstacle_ids is None:
+                blocking_obstacle_ids = self.terrain.obstacle_index.blocking(self.position)
 
-            directive = {} # what to do after sensing
-            if not blocking_obstacles: # if no obstacle
+            distress_data = self.distress_data(blocking_obstacle_ids)
+            if distress_data is None: # if no obstacle
                 velocity_resultant = self.velocity
                 rotation_angle = self.titter
                 directive = {
@@ -41,29 +103,38 @@ class Agent:
                     'titter': rotation_angle,
                 }
             else:
-                holes = self.get_holes(blocking_obstacles)
-                best_end_point = self.get_best_end_point(sorted_holes=holes)
-                safety_point = self.calculate_safety_position(best_end_point)
-                if best_end_point: # if obstacle(s) is/are traversible
-                    distress_call_response = self.transmit_distress({
-                        'type': cf.DISTRESS_OBSTACLE_FOUND_SAFETY,
-                        'agent_id': self.id,
-                        'safety_point': safety_point,
-                        'agents_in_sp_path': self.get_in_safety_point_path_agents()
-                    })
-                    distress_call_response.update({'type': cf.DISTRESS_OBSTACLE_FOUND_SAFETY})
-                    directive = distress_call_response
-                else: # if obstacle is too long or its a complete barricade
-                    # move to r or l
-                    distress_call_response = self.transmit_distress({
-                        'type': cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY,
-                        'agent_id': self.id,
-                        'agents_in_sp_path': self.get_in_safety_point_path_agents()
-                    })
-                    distress_call_response.update({'type': cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY})
-                    directive = distress_call_response
-
-            self.directive_complier(directive) # rotate to new titter and adjust velocity to new vr
+                directive = self.transmit_distress(distress_data)
+                if directive is None:
+                    return {}
+                directive.update({'type': distress_data['type']})
+
+            if comply:
+                self.directive_complier(directive) # rotate to new titter and adjust velocity to new vr
+            return directive
+        return {}
+
+    def distress_data(self, blocking_obstacle_ids: list) -> dict:
+        '''
+        Returns the distress call for the obstacles blocking this agent or None if none is blocking it
+        '''
+        if not len(blocking_obstacle_ids):
+            return None
+        holes = self.holes_from_table(self.terrain.hole_table(blocking_obstacle_ids))
+        best_end_point = self.get_best_end_point(sorted_holes=holes)
+        if best_end_point: # if obstacle(s) is/are traversible
+            return {
+                'type': cf.DISTRESS_OBSTACLE_FOUND_SAFETY,
+                'agent_id': self.id,
+                'safety_point': self.calculate_safety_position(best_end_point),
+                'agents_in_sp_path': self.get_in_safety_point_path_agents()
+            }
+        # if obstacle is too long or its a complete barricade
+        # move to r or l
+        return {
+            'type': cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY,
+            'agent_id': self.id,
+            'agents_in_sp_path': self.get_in_safety_point_path_agents()
+        }
 
     def translate(self):
         '''
@@ -77,6 +148,7 @@ class Agent:
 
             # recall s = vt
             self.position = self.position[0] + velocity_x_component * cf.TRANSLATION_INTERVAL, self.position[1] + velocity_y_component * cf.TRANSLATION_INTERVAL
+            self.terrain.neighbour_grid.update([self.id])
 
     def directive_complier(self, directive: dict):
         '''
@@ -84,22 +156,25 @@ class Agent:
         '''
         self.titter = directive['titter']
         self.velocity = directive['vr']
+        if directive.get('type') in DIRECTIVE_STATES:
+            self.state = DIRECTIVE_STATES[directive['type']]
 
     def reached_safety(self):
         '''If true, the agent's velocity vector is reset to nominal'''
         if self.position[0] >= self.safety_position[0] + 0.01 and self.position[1] >= self.safety_position[1] + 0.01:
-            self.velocity = cf.NOMINAL_VELOCITY
+            self.velocity = self.params.nominal_velocity
             self.titter = cf.NOMINAL_TITTER
+            self.state = cf.FORWARD_TRANSLATION
             self.safety_position = 0
 
     def transmit_distress(self, distress_data: dict) -> dict:
         '''
-        Broadcast a distress signal to all the agents in the terrain
+        Broadcast a distress signal to the swarm. Returns the directive resolved for it, or None if it went out on the
+        terrain's message bus, which delivers it in a later flush
         '''
-        # for agent in self.terrian.agents:
-        #     if agent == self:
-        #         continue
-        #     agent.receive_distress(self.id, distress_data)
+        if self.terrain.bus is not None:
+            self.terrain.bus.publish_distress(distress_data)
+            return None
         return self.terrain.receive_distress(self.id, distress_data)
 
     def calculate_safety_position(self, obstacle_end_position: tuple) -> tuple:
@@ -107,8 +182,8 @@ class Agent:
         Returns the safest point to rotate to
         '''
         obstacle_end_x, obstacle_end_y, direction = obstacle_end_position
-        safety_position_x = obstacle_end_x + direction * (cf.AGENT_RADIUS + cf.OBSTACLE_ALLOWANCE)
-        safety_position_y = obstacle_end_y - cf.AGENT_RADIUS - cf.OBSTACLE_ALLOWANCE
+        safety_position_x = obstacle_end_x + direction * (self.params.agent_radius + self.params.obstacle_allowance)
+        safety_position_y = obstacle_end_y - self.params.agent_radius - self.params.obstacle_allowance
         self.safety_position = safety_position_x, safety_position_y
         return safety_position_x, safety_position_y
     
@@ -118,10 +193,11 @@ class Agent:
         '''
         self_x, self_y = self.position
         distressed_agent_safety_x, distressed_agent_safety_y = distressed_agent_safety_position
-        distressed_agent_sefty_left_boundary, distressed_agent_safety_right_boundary = distressed_agent_safety_x - cf.SAFETY_RADIUS, distressed_agent_safety_x + cf.SAFETY_RADIUS
-        if self_y - distressed_agent_safety_y <= cf.SAFETY_RADIUS: # this agent is ahead of distressed agent but not clear of its safety point
-            self.position = self_x, self_y + cf.SAFETY_RADIUS - (self_y - distressed_agent_safety_y) # i.e safety_radius + distressed_y #if simplified
-        if self_x < distressed_agent_sefty_left_boundary or self_x > distressed_agent_safety_right_boundary: # and self_y > (distressed_agent_safety_y + cf.SAFETY_RADIUS + cf.OBSTACLE_ALLOWANCE):
+        distressed_agent_sefty_left_boundary, distressed_agent_safety_right_boundary = distressed_agent_safety_x - self.params.safety_radius, distressed_agent_safety_x + self.params.safety_radius
+        if self_y - distressed_agent_safety_y <= self.params.safety_radius: # this agent is ahead of distressed agent but not clear of its safety point
+            self.position = self_x, self_y + self.params.safety_radius - (self_y - distressed_agent_safety_y) # i.e safety_radius + distressed_y #if simplified
+            self.terrain.neighbour_grid.update([self.id])
+        if self_x < distressed_agent_sefty_left_boundary or self_x > distressed_agent_safety_right_boundary: # and self_y > (distressed_agent_safety_y + self.params.safety_radius + self.params.obstacle_allowance):
             return False
         else:
             return True
@@ -131,25 +207,29 @@ class Agent:
         '''
         Returns a list of all the agents that are on a collision course to the distress safety point. Starting from the closest
         '''
-        in_path_agents = []
-        for agent in self.terrain.agents:
-            if agent == self:
-                continue
-            if agent.in_path_check(self.position):
-                in_path_agents.append(agent.id)
-        if in_path_agents:
-            sorted_in_path_agents = list(sorted(in_path_agents, key=lambda x: self.terrain.agents[x].position[1], reverse=True))
-            return sorted_in_path_agents
-        return in_path_agents
-            
-    def position_request(self) -> dict:
+        self_x, self_y = self.position
+        swarm_ys = self.swarm.positions[:, 1]
+
+        # agents ahead of this agent but not clear of its safety point are pushed clear of it (see in_path_check)
+        not_clear = swarm_ys - self_y <= self.params.safety_radius
+        not_clear[self.id] = False
+        swarm_ys[not_clear] = swarm_ys[not_clear] + self.params.safety_radius - (swarm_ys[not_clear] - self_y)
+        self.terrain.neighbour_grid.update(np.flatnonzero(not_clear))
+
+        in_path_agents = self.terrain.neighbour_grid.corridor(self_x - self.params.safety_radius, self_x + self.params.safety_radius)
+        in_path_agents = in_path_agents[in_path_agents != self.id]
+        sorted_in_path_agents = in_path_agents[np.lexsort((in_path_agents, -swarm_ys[in_path_agents]))]
+        return sorted_in_path_agents.tolist()
+
+    def position_request(self, radius: float = None) -> dict:
         '''
-        Get the positions of all agents in the terrain -> {node_id: position}
+        Get the positions of all agents in the terrain, or only those within radius of this agent -> {node_id: position}
         '''
-        positions = {}
-        for agent in self.terrain.agents:
-            positions[agent.id] = agent.position
-        return positions
+        if radius is None:
+            agent_ids = range(self.swarm.size)
+        else:
+            agent_ids = self.terrain.neighbour_grid.radius(self.position, radius).tolist()
+        return {agent_id: tuple(self.swarm.positions[agent_id]) for agent_id in agent_ids}
 
     def time_to_arrive(self, destination: tuple, direction: str = 'free') -> float:
         '''
@@ -157,7 +237,7 @@ class Agent:
         '''
         self_x, self_y = self.position
         destination_x, destination_y = destination
-        distance_to_destination = np.sqrt(np.square(self_x - destination_x) - np.square(self_y - destination_y)) - cf.SAFETY_RADIUS
+        distance_to_destination = np.sqrt(np.square(self_x - destination_x) - np.square(self_y - destination_y)) - self.params.safety_radius
         if direction not in ['free', 'horizontal', 'vertical']: # free: in the direction of the velocity vector
             raise VelocityDirectionError('Velocity direction is incorrect')
         if direction == 'free':
@@ -175,7 +255,7 @@ class Agent:
         '''
         self_x, self_y = self.position
         destination_x, destination_y = destination
-        distance_to_destination = np.sqrt(np.square(self_x - destination_x) - np.square(self_y - destination_y)) + cf.SAFETY_RADIUS
+        distance_to_destination = np.sqrt(np.square(self_x - destination_x) - np.square(self_y - destination_y)) + self.params.safety_radius
         if direction not in ['free', 'horizontal', 'vertical']: # free: in the direction of the velocity vector
             raise VelocityDirectionError('Velocity direction is incorrect')
         if direction == 'free':
@@ -191,19 +271,19 @@ class Agent:
         '''
         Can this agent translate along the x axis to give way to the distressed agent?
         '''
-        agents_positions = self.position_request()
-        agents_within_vicinity = {'left': [], 'right': []}
-        for agent_id, position in agents_positions.items():
-            x_distance = self.position[0] - position[0] # horizontal distance between self agent and this agent
-            y_distance = self.position[1] - position[1] # vertical distance between self agent and this agent
-
-            # check if there are any agents within the vicinity of this agent before translation decision is made
-            if np.abs(x_distance) < ((2 * safe_radius_units + 1) * cf.SAFETY_RADIUS + cf.AGENT_RADIUS) and np.abs(y_distance) > (2 * cf.SAFETY_RADIUS + cf.AGENT_RADIUS):
-                if x_distance > 0:
-                    agents_within_vicinity['left'].append(agent_id)
-                else:
-                    agents_within_vicinity['right'].append(agent_id)
-        
+        vicinity_x_distance = (2 * safe_radius_units + 1) * self.params.safety_radius + self.params.agent_radius
+        self_x, self_y = self.position
+        agent_ids = self.terrain.neighbour_grid.corridor(self_x - vicinity_x_distance, self_x + vicinity_x_distance)
+        x_distances = self_x - self.swarm.positions[agent_ids, 0] # horizontal distance between self agent and the other agents
+        y_distances = self_y - self.swarm.positions[agent_ids, 1] # vertical distance between self agent and the other agents
+
+        # check if there are any agents within the vicinity of this agent before translation decision is made
+        within_vicinity = (np.abs(x_distances) < vicinity_x_distance) & (np.abs(y_distances) > (2 * self.params.safety_radius + self.params.agent_radius))
+        agents_within_vicinity = {
+            'left': agent_ids[within_vicinity & (x_distances > 0)].tolist(),
+            'right': agent_ids[within_vicinity & (x_distances <= 0)].tolist(),
+        }
+
         if not agents_within_vicinity['left']:
             return True, 'left'
         elif not agents_within_vicinity['right']:
@@ -213,36 +293,21 @@ class Agent:
 
     def get_holes(self, obstacles: list) -> list:
         '''
-        Returns the details of the openings between obstacles
+        Returns the details of the openings between obstacles, closest to the agent first
         
         Hole and obstacle archtecture:
         hole_0 [obatacle_0] hole_1 [obtacle_1] hole_2 [obstacle_2] .... [obstacle_n] hole_n+1
         
         Note: hole_0 and hole_n+1 could be empty
         '''
-        obstacle_xs_y = [(obstacle[0], obstacle[0] + obstacle[2], obstacle[1]) for obstacle in obstacles]
-        # The two x coordinates and y coordinate of the obstacles
-        print('obstacle_xs_y: ', obstacle_xs_y)
-        self.sorted_obstacle_xs_y = list(sorted(obstacle_xs_y, key = lambda x: x[0]))
-        print('sorted_obstacle_xs_y: ', self.sorted_obstacle_xs_y)
-        holes = []
-        if obstacle_xs_y:
-            if self.sorted_obstacle_xs_y[0][0] > 0:
-                hole_gap = self.sorted_obstacle_xs_y[0][0] - 0
-                hole_centre_dx_with_agent = self.position[0] - (0 + hole_gap / 2)
-                holes.append((hole_gap, hole_centre_dx_with_agent, 0))
-            for hole_index in range(1, len(self.sorted_obstacle_xs_y)):
-                hole_gap = self.sorted_obstacle_xs_y[hole_index][0] - self.sorted_obstacle_xs_y[hole_index - 1][1]
-                # if dx is +ve then hole is on the left of the agent
-                hole_centre_dx_with_agent = self.position[0] - (self.sorted_obstacle_xs_y[hole_index -1][1] + hole_gap / 2)
-                holes.append((hole_gap, hole_centre_dx_with_agent, hole_index))
-            if self.sorted_obstacle_xs_y[-1][1] < self.terrain.width:
-                hole_gap = self.terrain.width - self.sorted_obstacle_xs_y[-1][1]
-                hole_centre_dx_with_agent = self.position[0] - (self.terrain.width - self.sorted_obstacle_xs_y[-1][1])
-                holes.append((hole_gap, hole_centre_dx_with_agent, len(holes))) # last index is previous length before appending
-            sorted_holes = list(sorted(holes, key = lambda x: np.abs(x[1])))
-            return sorted_holes
-        return []
+        return self.holes_from_table(HoleTable(obstacles, self.terrain.width))
+
+    def holes_from_table(self, hole_table: HoleTable) -> list:
+        '''
+        Returns the holes of a hole table, closest to the agent first
+        '''
+        self.sorted_obstacle_xs_y = hole_table.sorted_obstacle_xs_y
+        return hole_table.holes(self.position[0])
 
     def get_best_end_point(self, sorted_holes: list) -> tuple:
         '''
@@ -254,7 +319,7 @@ class Agent:
         Note: hole_0 and hole_n+1 could be empty
         '''
         for hole in sorted_holes:
-            if hole[0] > 2 * (cf.AGENT_RADIUS + cf.OBSTACLE_ALLOWANCE): # if hole_gap is enough for agent to pass
+            if hole[0] > 2 * (self.params.agent_radius + self.params.obstacle_allowance): # if hole_gap is enough for agent to pass
                 if hole[1] > 0: # if hole is on the left of the agent. use the left x (0) of the obstacle
                     best_end_point = self.sorted_obstacle_xs_y[hole[2]][0], self.sorted_obstacle_xs_y[hole[2]][2], +1
                 else: # if hole is on the right of the agent. use the right x (1) of the obstacle
@@ -0,0 +1,135 @@
+import os
+import json
+import numpy as np
+import config as cf
+from swarm.terrain import Terrain
+from swarm.params import Params
+
+
+OBSTACLES_FILE = 'obstacles.npy'
+METADATA_FILE = 'course.json'
+
+
+def write_course(directory: str, obstacles, width: float, height: float, tile_height: float = 100):
+    '''
+    Store an obstacle course on disk as obstacles sorted by y and split into tiles of tile_height metres
+    '''
+    obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 4)
+    obstacles = obstacles[np.argsort(obstacles[:, 1], kind='stable')]
+    tile_count = max(1, int(np.ceil(height / tile_height)))
+    tile_starts = np.searchsorted(obstacles[:, 1], np.arange(tile_count + 1) * tile_height, side='left')
+    tile_starts[0] = 0 # obstacles before the start of the course, e.g. behind a large swarm's spawn region, belong to the first tile
+    tile_starts[-1] = len(obstacles) # obstacles at or beyond the end of the course belong to the last tile
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, OBSTACLES_FILE), obstacles)
+    with open(os.path.join(directory, METADATA_FILE), 'w') as file:
+        json.dump({'width': width, 'height': height, 'tile_height': tile_height, 'tile_starts': tile_starts.tolist()}, file)
+
+
+class TiledCourse:
+    '''
+    An obstacle course written by write_course. The obstacles are memory-mapped and read a tile at a time
+    '''
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, METADATA_FILE)) as file:
+            metadata = json.load(file)
+        self.width = metadata['width']
+        self.height = metadata['height']
+        self.tile_height = metadata['tile_height']
+        self.tile_starts = np.array(metadata['tile_starts'], dtype=np.int64)
+        self.obstacles = np.load(os.path.join(directory, OBSTACLES_FILE), mmap_mode='r')
+
+    def __len__(self) -> int:
+        return len(self.tile_starts) - 1
+
+    def tile(self, tile_index: int) -> list:
+        '''
+        Returns the (x, y, dx, dy) obstacles of a tile
+        '''
+        return list(map(tuple, self.obstacles[self.tile_starts[tile_index]:self.tile_starts[tile_index + 1]].tolist()))
+
+    def tiles_between(self, y_min: float, y_max: float) -> range:
+        '''
+        Returns the indices of the tiles holding obstacles with y_min <= y <= y_max
+        '''
+        first, last = self.tile_ranges(np.array([y_min]), np.array([y_max]))
+        return range(int(first[0]), int(last[0]) + 1)
+
+    def tile_ranges(self, y_mins: np.ndarray, y_maxs: np.ndarray) -> tuple:
+        '''
+        Returns the first and last indices of the tiles holding obstacles with y_min <= y <= y_max, for many ranges
+        '''
+        firsts = np.clip(np.floor(y_mins / self.tile_height), 0, len(self) - 1).astype(np.int64)
+        lasts = np.clip(np.floor(y_maxs / self.tile_height), 0, len(self) - 1).astype(np.int64)
+        return firsts, lasts
+
+    def terrain(self, rng: np.random.Generator = None, agent_count: int = 5, params: Params = None, spawn_region: tuple = None, formation: str = 'random') -> Terrain:
+        '''
+        Returns an empty terrain the size of the course, to be filled by a TileStreamer
+        '''
+        return Terrain(self.width, self.height, [], rng=rng, agent_count=agent_count, params=params, spawn_region=spawn_region, formation=formation)
+
+
+class TileStreamer:
+    '''
+    Keeps the tiles of a course near the agents loaded on a terrain and evicts the rest
+
+    Every agent needs the tiles holding obstacles from lookbehind metres behind it to lookahead metres ahead of it,
+    and the union of those windows is loaded. At most (lookbehind + lookahead) / tile height + 2 tiles per agent are
+    held, however far apart the agents drift
+    '''
+    def __init__(self, terrain: Terrain, course: TiledCourse, lookahead: float = None, lookbehind: float = None):
+        self.terrain = terrain
+        self.course = course
+        self.lookahead = lookahead if lookahead is not None else course.tile_height + self.terrain.params.obstacle_panic_act_distance
+        self.lookbehind = lookbehind if lookbehind is not None else self.terrain.params.obstacle_panic_act_distance
+        self.loaded = {} # tile index -> ids of its obstacles on the terrain
+        self.update()
+
+    def observe(self, simulation):
+        self.update()
+
+    def agent_windows(self) -> tuple:
+        '''
+        Returns the ids of the agents with finite positions and the first and last tiles each of them needs
+        '''
+        positions = self.terrain.swarm.positions
+        agent_ids = np.flatnonzero(np.all(np.isfinite(positions), axis=1))
+        ys = positions[agent_ids, 1]
+        return (agent_ids, *self.course.tile_ranges(ys - self.lookbehind, ys + self.lookahead))
+
+    def update(self):
+        '''
+        Load the tiles the agents are approaching and evict the ones no agent needs any more
+        '''
+        _, firsts, lasts = self.agent_windows()
+        counts = lasts - firsts + 1
+        tiles = np.repeat(firsts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        needed = set(np.unique(tiles).tolist())
+        for tile_index in list(self.loaded):
+            if tile_index not in needed:
+                self.terrain.remove_obstacles(self.loaded.pop(tile_index))
+        for tile_index in sorted(needed - set(self.loaded)):
+            self.loaded[tile_index] = self.terrain.add_obstacles(self.course.tile(tile_index))
+
+    def safe_ticks(self, simulation) -> int:
+        '''
+        Returns how many ticks the agents can move at their current velocities before one could sense beyond its loaded
+        window, ahead of it or, for agents headed backwards, behind it
+        '''
+        agent_ids, firsts, lasts = self.agent_windows()
+        if not all(tile_index in self.loaded for tile_index in np.unique(np.concatenate([firsts, lasts])).tolist()):
+            return 0
+        panic_distance = self.terrain.params.obstacle_panic_act_distance
+        ys = self.terrain.swarm.positions[agent_ids, 1]
+        steps = self.terrain.swarm.displacements()[agent_ids, 1]
+        # the ends of the course have no tiles beyond them
+        window_tops = np.where(lasts == len(self.course) - 1, np.inf, (lasts + 1) * self.course.tile_height)
+        window_bottoms = np.where(firsts == 0, -np.inf, firsts * self.course.tile_height)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            room = np.where(steps > 0, window_tops - panic_distance - ys, ys - panic_distance - window_bottoms)
+            ticks = np.ceil(room / np.abs(steps)) - 1 # the sensing window stays strictly within the loaded tiles
+        ticks = ticks[(steps != 0) & np.isfinite(ticks)]
+        if not len(ticks):
+            return np.iinfo(np.int64).max
+        return max(0, int(ticks.min()))
@@ -0,0 +1,99 @@
+import os
+import multiprocessing
+import numpy as np
+import config as cf
+from swarm.terrain import Terrain, random_obstacles
+from swarm.simulation import Simulation
+from swarm.params import Params
+from swarm.metrics import SafetyMetrics
+from swarm.spawn import SPAWN_BAND_TOP
+
+
+TICK_BUDGET_FACTOR = 3 # default run length as a multiple of the ticks a straight run across the terrain takes
+
+# one row of the ensemble result table per scenario
+RESULT_DTYPE = np.dtype([
+    ('scenario', np.int64),
+    ('ticks', np.int64),
+    ('completion_time', np.float64), # nan if the swarm did not traverse the terrain in time
+    ('diverged', np.bool_), # an agent's position became non-finite, which ends the run
+    ('halts', np.int64), # times an agent was brought to a halt behind a distressed agent
+    ('distress_found_safety', np.int64),
+    ('distress_not_found_safety', np.int64),
+    ('near_misses', np.int64), # see SafetyMetrics
+    ('collisions', np.int64),
+    ('obstacle_intrusions', np.int64),
+    ('min_separation', np.float64),
+])
+
+
+class Scenario:
+    '''
+    One independent run of an ensemble
+    '''
+    def __init__(self, seed, obstacles: list, width: float = 20, height: float = 50, ticks: int = None, params: Params = None):
+        self.seed = seed # anything numpy.random.default_rng accepts, e.g. an int or a SeedSequence
+        self.obstacles = obstacles
+        self.width = width
+        self.height = height
+        self.params = params if params is not None else Params()
+        self.tick_limit = ticks # None to derive it from the terrain and parameters
+
+    @property
+    def ticks(self) -> int:
+        '''Upper bound on the run length'''
+        if self.tick_limit is not None:
+            return self.tick_limit
+        # enough for agents spawned at the back of the spawn band to cross at nominal velocity, with detours
+        return int(np.ceil(TICK_BUDGET_FACTOR * (self.height + SPAWN_BAND_TOP) / (self.params.nominal_velocity * cf.TRANSLATION_INTERVAL)))
+
+
+def run_scenario(indexed_scenario: tuple) -> tuple:
+    '''
+    Simulate a scenario until the swarm traverses the terrain, an agent's position diverges or it runs out of ticks.
+    Returns its result row
+    '''
+    index, scenario = indexed_scenario
+    terrain = Terrain(scenario.width, scenario.height, scenario.obstacles, rng=np.random.default_rng(scenario.seed), params=scenario.params)
+    metrics = SafetyMetrics(terrain)
+    simulation = Simulation(terrain, observers=[metrics])
+    while simulation.tick < scenario.ticks and not simulation.completed and not simulation.diverged:
+        simulation.step()
+    return (
+        index,
+        simulation.tick,
+        simulation.time if simulation.completed else np.nan,
+        simulation.diverged,
+        simulation.halts,
+        simulation.distress_counts[cf.DISTRESS_OBSTACLE_FOUND_SAFETY],
+        simulation.distress_counts[cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY],
+        metrics.near_misses,
+        metrics.collisions,
+        metrics.obstacle_intrusions,
+        metrics.min_separation,
+    )
+
+
+def run_ensemble(scenarios: list, processes: int = None, chunksize: int = None) -> np.ndarray:
+    '''
+    Run every scenario across a process pool -> result table (structured array ordered by scenario)
+    '''
+    processes = processes or os.cpu_count()
+    if chunksize is None:
+        chunksize = max(1, len(scenarios) // (processes * 8))
+    with multiprocessing.Pool(processes) as pool:
+        rows = list(pool.imap_unordered(run_scenario, enumerate(scenarios), chunksize=chunksize))
+    results = np.array(rows, dtype=RESULT_DTYPE)
+    return np.sort(results, order='scenario')
+
+
+def random_scenarios(count: int, seed: int = None, width: float = 20, height: float = 50, obstacle_count: int = 2, ticks: int = None, params: Params = None) -> list:
+    '''
+    Returns scenarios with random obstacle layouts, each with its own independent random stream
+    '''
+    scenarios = []
+    for scenario_seed in np.random.SeedSequence(seed).spawn(count):
+        layout_rng = np.random.default_rng(scenario_seed.spawn(1)[0])
+        obstacles = random_obstacles(obstacle_count, width, height, layout_rng)
+        scenarios.append(Scenario(scenario_seed, obstacles, width, height, ticks, params))
+    return scenarios
@@ -0,0 +1,74 @@
+import numpy as np
+import config as cf
+
+
+# event windows are widened by this much so rounding can only make an event come early, never late
+WINDOW_TOLERANCE = 1e-9
+
+
+def crossing_interval(start: np.ndarray, step: np.ndarray, low, high) -> tuple:
+    '''
+    Returns the range [j_low, j_high] of real j for which low <= start + j * step <= high
+    '''
+    inside = (start >= low) & (start <= high)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low_crossing = (low - start) / step
+        high_crossing = (high - start) / step
+    j_low = np.where(step > 0, low_crossing, np.where(step < 0, high_crossing, np.where(inside, -np.inf, np.inf)))
+    j_high = np.where(step > 0, high_crossing, np.where(step < 0, low_crossing, np.where(inside, np.inf, -np.inf)))
+    return j_low, j_high
+
+
+def first_tick_within(j_low: np.ndarray, j_high: np.ndarray) -> np.ndarray:
+    '''
+    Returns the first whole tick j >= 0 in each range, or inf if a range holds none
+    '''
+    first = np.maximum(np.ceil(j_low), 0)
+    return np.where(first <= j_high, first, np.inf)
+
+
+def ticks_to_next_event(terrain, horizon: int) -> int:
+    '''
+    Returns how many ticks the swarm can cruise before a tick that needs a full step, at most horizon
+
+    A full step is needed once an agent that can sense enters the panic window of an obstacle or an agent passes its
+    safety point. Until then every tick leaves each agent's velocity vector as it is, so the agents move in straight lines
+    '''
+    swarm = terrain.swarm
+    velocity_x_component, velocity_y_component = swarm.velocity_components()
+    moving = ~swarm.halted
+    step_x = np.where(moving, velocity_x_component * cf.TRANSLATION_INTERVAL, 0)
+    step_y = np.where(moving, velocity_y_component * cf.TRANSLATION_INTERVAL, 0)
+    next_event = float(horizon)
+
+    # agents entering the panic window of an obstacle
+    index = terrain.obstacle_index
+    sensing = np.flatnonzero(swarm.can_sense)
+    if len(sensing) and len(index):
+        xs, ys = swarm.positions[sensing, 0], swarm.positions[sensing, 1]
+        swept_ys = np.stack([ys, ys + horizon * step_y[sensing]])
+        starts, _ = index.window(swept_ys.min(axis=0) - WINDOW_TOLERANCE)
+        _, stops = index.window(swept_ys.max(axis=0) + WINDOW_TOLERANCE)
+        counts = np.maximum(stops - starts, 0)
+        owners = np.repeat(np.arange(len(sensing)), counts)
+        candidates = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        if len(candidates):
+            agent_ids = sensing[owners]
+            y_low, y_high = crossing_interval(ys[owners], step_y[agent_ids],
+                                              index.ys[candidates] - terrain.params.obstacle_panic_act_distance - WINDOW_TOLERANCE,
+                                              index.ys[candidates] + terrain.params.obstacle_panic_act_distance + WINDOW_TOLERANCE)
+            x_low, x_high = crossing_interval(xs[owners], step_x[agent_ids],
+                                              index.left_xs[candidates] - terrain.params.agent_radius - WINDOW_TOLERANCE,
+                                              index.right_xs[candidates] + terrain.params.agent_radius + WINDOW_TOLERANCE)
+            next_event = min(next_event, first_tick_within(np.maximum(y_low, x_low), np.minimum(y_high, x_high)).min())
+
+    # agents passing their safety point
+    heading = np.flatnonzero(swarm.has_safety)
+    if len(heading):
+        safety_xs = swarm.safety_positions[heading, 0] + 0.01 - WINDOW_TOLERANCE
+        safety_ys = swarm.safety_positions[heading, 1] + 0.01 - WINDOW_TOLERANCE
+        x_low, x_high = crossing_interval(swarm.positions[heading, 0], step_x[heading], safety_xs, np.inf)
+        y_low, y_high = crossing_interval(swarm.positions[heading, 1], step_y[heading], safety_ys, np.inf)
+        next_event = min(next_event, first_tick_within(np.maximum(x_low, y_low), np.minimum(x_high, y_high)).min())
+
+    return int(min(next_event, horizon))
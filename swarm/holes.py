@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import numpy as np
+
+
+class HoleTable:
+    '''
+    The openings between a set of obstacles, independent of the agent looking at them
+
+    Hole and obstacle archtecture:
+    hole_0 [obatacle_0] hole_1 [obtacle_1] hole_2 [obstacle_2] .... [obstacle_n] hole_n+1
+
+    Note: hole_0 and hole_n+1 could be empty
+    '''
+    def __init__(self, obstacles: list, terrain_width: float):
+        obstacle_xs_y = [(obstacle[0], obstacle[0] + obstacle[2], obstacle[1]) for obstacle in obstacles]
+        # The two x coordinates and y coordinate of the obstacles
+        self.sorted_obstacle_xs_y = list(sorted(obstacle_xs_y, key = lambda x: x[0]))
+        gaps, centres, indices = [], [], []
+        if obstacle_xs_y:
+            if self.sorted_obstacle_xs_y[0][0] > 0:
+                hole_gap = self.sorted_obstacle_xs_y[0][0] - 0
+                gaps.append(hole_gap)
+                centres.append(0 + hole_gap / 2)
+                indices.append(0)
+            for hole_index in range(1, len(self.sorted_obstacle_xs_y)):
+                hole_gap = self.sorted_obstacle_xs_y[hole_index][0] - self.sorted_obstacle_xs_y[hole_index - 1][1]
+                gaps.append(hole_gap)
+                centres.append(self.sorted_obstacle_xs_y[hole_index -1][1] + hole_gap / 2)
+                indices.append(hole_index)
+            if self.sorted_obstacle_xs_y[-1][1] < terrain_width:
+                hole_gap = terrain_width - self.sorted_obstacle_xs_y[-1][1]
+                gaps.append(hole_gap)
+                centres.append(terrain_width - self.sorted_obstacle_xs_y[-1][1])
+                indices.append(len(self.sorted_obstacle_xs_y) - 1) # the last hole is bounded by the last obstacle
+        self.gaps = np.array(gaps, dtype=float)
+        self.centres = np.array(centres, dtype=float)
+        self.indices = np.array(indices, dtype=np.int64)
+
+    def holes(self, x: float) -> list:
+        '''
+        Returns the holes as (hole_gap, hole_centre_dx_with_agent, hole_index) sorted by distance from an agent at x
+        '''
+        # if dx is +ve then hole is on the left of the agent
+        hole_centre_dxs_with_agent = x - self.centres
+        order = np.argsort(np.abs(hole_centre_dxs_with_agent), kind='stable')
+        return list(zip(self.gaps[order].tolist(), hole_centre_dxs_with_agent[order].tolist(), self.indices[order].tolist()))
+
+
+class HoleTableCache:
+    '''
+    Least recently used hole tables keyed by the ids of the obstacles they were built from
+    '''
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.tables = OrderedDict()
+        self.keys_by_obstacle = {} # obstacle id -> keys of the cached tables built from it
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.tables)
+
+    def get(self, obstacle_ids: tuple, build) -> HoleTable:
+        '''
+        Returns the table of obstacle_ids, calling build() to make it if it is not cached
+        '''
+        table = self.tables.get(obstacle_ids)
+        if table is not None:
+            self.hits += 1
+            self.tables.move_to_end(obstacle_ids)
+            return table
+        self.misses += 1
+        table = self.tables[obstacle_ids] = build()
+        for obstacle_id in obstacle_ids:
+            self.keys_by_obstacle.setdefault(obstacle_id, set()).add(obstacle_ids)
+        if len(self.tables) > self.maxsize:
+            self._discard(next(iter(self.tables)))
+        return table
+
+    def invalidate(self, obstacle_id: int):
+        '''
+        Drop every table built from an obstacle
+        '''
+        for obstacle_ids in list(self.keys_by_obstacle.get(obstacle_id, ())):
+            self._discard(obstacle_ids)
+
+    def _discard(self, obstacle_ids: tuple):
+        del self.tables[obstacle_ids]
+        for obstacle_id in obstacle_ids:
+            keys = self.keys_by_obstacle[obstacle_id]
+            keys.discard(obstacle_ids)
+            if not keys:
+                del self.keys_by_obstacle[obstacle_id]
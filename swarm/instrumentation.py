@@ -0,0 +1,146 @@
+import json
+import time
+import cProfile
+import contextlib
+
+
+class Instrumentation:
+    '''
+    Times simulation phases and counts events, fanning every measurement out to a list of sinks
+
+    A sink implements any of begin_phase(name, tick), end_phase(name, tick, seconds), count(name, amount, tick) and close()
+    '''
+    enabled = True
+
+    def __init__(self, sinks: list = None):
+        self.sinks = sinks or []
+        self.phase_beginners = [sink.begin_phase for sink in self.sinks if hasattr(sink, 'begin_phase')]
+        self.phase_enders = [sink.end_phase for sink in self.sinks if hasattr(sink, 'end_phase')]
+        self.counters = [sink.count for sink in self.sinks if hasattr(sink, 'count')]
+
+    def phase(self, name: str, tick: int):
+        '''
+        Context manager timing one run of a phase
+        '''
+        return PhaseTimer(self, name, tick)
+
+    def count(self, name: str, amount: int, tick: int):
+        for counter in self.counters:
+            counter(name, amount, tick)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+
+class PhaseTimer:
+    __slots__ = ('instrumentation', 'name', 'tick', 'start')
+
+    def __init__(self, instrumentation: Instrumentation, name: str, tick: int):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.tick = tick
+
+    def __enter__(self):
+        for begin_phase in self.instrumentation.phase_beginners:
+            begin_phase(self.name, self.tick)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        for end_phase in self.instrumentation.phase_enders:
+            end_phase(self.name, self.tick, seconds)
+
+
+class NullInstrumentation:
+    '''
+    Instrumentation that records nothing. Used when a simulation is not instrumented
+    '''
+    enabled = False
+    _phase = contextlib.nullcontext()
+
+    def phase(self, name: str, tick: int):
+        return self._phase
+
+    def count(self, name: str, amount: int, tick: int):
+        pass
+
+    def close(self):
+        pass
+
+
+NULL_INSTRUMENTATION = NullInstrumentation()
+
+
+class AggregateSink:
+    '''
+    Keeps running totals of phase times and counters in memory
+    '''
+    def __init__(self):
+        self.phase_seconds = {}
+        self.phase_calls = {}
+        self.phase_max_seconds = {}
+        self.counters = {}
+
+    def end_phase(self, name: str, tick: int, seconds: float):
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+        self.phase_calls[name] = self.phase_calls.get(name, 0) + 1
+        self.phase_max_seconds[name] = max(self.phase_max_seconds.get(name, 0.0), seconds)
+
+    def count(self, name: str, amount: int, tick: int):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> dict:
+        return {
+            'phases': {name: {
+                'seconds': seconds,
+                'calls': self.phase_calls[name],
+                'mean_seconds': seconds / self.phase_calls[name],
+                'max_seconds': self.phase_max_seconds[name],
+            } for name, seconds in self.phase_seconds.items()},
+            'counters': dict(self.counters),
+        }
+
+
+class JsonlTraceSink:
+    '''
+    Writes every phase time and counter increment as one JSON line
+    '''
+    def __init__(self, path: str):
+        self.file = open(path, 'w')
+
+    def end_phase(self, name: str, tick: int, seconds: float):
+        self.file.write(json.dumps({'tick': tick, 'phase': name, 'seconds': seconds}) + '\n')
+
+    def count(self, name: str, amount: int, tick: int):
+        self.file.write(json.dumps({'tick': tick, 'counter': name, 'amount': amount}) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ProfileSink:
+    '''
+    Runs cProfile inside the instrumented phases while active. Stats are dumped to path on close if given
+    '''
+    def __init__(self, path: str = None, phases: list = None, active: bool = True):
+        self.path = path
+        self.phases = phases # profile only these phases, all of them if not given
+        self.active = active
+        self.profile = cProfile.Profile()
+
+    def toggle(self, active: bool = None):
+        self.active = not self.active if active is None else active
+
+    def begin_phase(self, name: str, tick: int):
+        if self.active and (self.phases is None or name in self.phases):
+            self.profile.enable()
+
+    def end_phase(self, name: str, tick: int, seconds: float):
+        self.profile.disable()
+
+    def close(self):
+        if self.path:
+            self.profile.dump_stats(self.path)
@@ -0,0 +1,110 @@
+import heapq
+import asyncio
+import itertools
+import numpy as np
+import config as cf
+
+
+# message kinds
+DISTRESS = 'distress'
+POSITIONS = 'positions'
+
+
+class MessageBus:
+    '''
+    In-process broker for the messages agents broadcast, with simulated latency and message loss
+
+    Messages published during a tick are batched and delivered together by flush(). Distress messages are coalesced
+    to the latest one of each sender and position broadcasts to the latest position of each agent
+    '''
+    def __init__(self, latency: float = 0, drop_rate: float = 0, rng: np.random.Generator = None):
+        self.latency_ticks = int(np.ceil(latency / cf.TRANSLATION_INTERVAL)) # messages arrive this many ticks after they are sent
+        self.drop_rate = drop_rate
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.in_flight = [] # heap of (delivery tick, sequence number, kind, batch)
+        self.sequence = itertools.count()
+        self.distress_outbox = {} # distress messages of the current tick by sender
+        self.positions_outbox = [] # (agent_ids, positions) broadcasts of the current tick
+        self.subscribers = {DISTRESS: [], POSITIONS: []}
+        self.published = {DISTRESS: 0, POSITIONS: 0}
+        self.dropped = {DISTRESS: 0, POSITIONS: 0}
+        self.delivered = {DISTRESS: 0, POSITIONS: 0}
+
+    def subscribe(self, kind: str) -> asyncio.Queue:
+        '''
+        Returns a queue that receives every delivered batch of a message kind
+        '''
+        queue = asyncio.Queue()
+        self.subscribers[kind].append(queue)
+        return queue
+
+    def publish_distress(self, distress_data: dict):
+        self.published[DISTRESS] += 1
+        self.distress_outbox[distress_data['agent_id']] = distress_data
+
+    def publish_positions(self, agent_ids: np.ndarray, positions: np.ndarray):
+        '''
+        Broadcast the positions of many agents at once
+        '''
+        agent_ids = np.asarray(agent_ids, dtype=np.int64).reshape(-1)
+        self.published[POSITIONS] += len(agent_ids)
+        self.positions_outbox.append((agent_ids, np.array(positions, dtype=float).reshape(-1, 2)))
+
+    def _send(self, tick: int):
+        '''
+        Put this tick's coalesced messages in flight, losing each with probability drop_rate
+        '''
+        distress_messages = list(self.distress_outbox.values())
+        kept = self.rng.random(len(distress_messages)) >= self.drop_rate
+        self.dropped[DISTRESS] += int(np.count_nonzero(~kept))
+        distress_messages = [distress_data for distress_data, keep in zip(distress_messages, kept) if keep]
+        if distress_messages:
+            heapq.heappush(self.in_flight, (tick + self.latency_ticks, next(self.sequence), DISTRESS, distress_messages))
+
+        if self.positions_outbox:
+            agent_ids, positions = _latest_positions(self.positions_outbox)
+            kept = self.rng.random(len(agent_ids)) >= self.drop_rate
+            self.dropped[POSITIONS] += int(np.count_nonzero(~kept))
+            if np.any(kept):
+                heapq.heappush(self.in_flight, (tick + self.latency_ticks, next(self.sequence), POSITIONS, (agent_ids[kept], positions[kept])))
+        self.distress_outbox = {}
+        self.positions_outbox = []
+
+    async def flush(self, tick: int) -> dict:
+        '''
+        Send this tick's messages and deliver every batch due by tick -> {kind: batch}
+
+        The distress batch is a list of distress messages, the positions batch an (agent_ids, positions) pair
+        '''
+        self._send(tick)
+        due = {DISTRESS: [], POSITIONS: []}
+        while self.in_flight and self.in_flight[0][0] <= tick:
+            _, _, kind, batch = heapq.heappop(self.in_flight)
+            due[kind].append(batch)
+
+        # a late message is superseded by a newer one from the same sender arriving with it
+        distress_messages = {}
+        for batch in due[DISTRESS]:
+            for distress_data in batch:
+                distress_messages[distress_data['agent_id']] = distress_data
+        delivered = {DISTRESS: list(distress_messages.values())}
+        delivered[POSITIONS] = _latest_positions(due[POSITIONS])
+
+        self.delivered[DISTRESS] += len(delivered[DISTRESS])
+        self.delivered[POSITIONS] += len(delivered[POSITIONS][0])
+        for kind, batch in delivered.items():
+            for queue in self.subscribers[kind]:
+                await queue.put(batch)
+        return delivered
+
+
+def _latest_positions(broadcasts: list) -> tuple:
+    '''
+    Coalesce (agent_ids, positions) broadcasts, oldest first, to the latest position of each agent
+    '''
+    if not broadcasts:
+        return np.empty(0, dtype=np.int64), np.empty((0, 2))
+    agent_ids = np.concatenate([agent_ids for agent_ids, _ in broadcasts])
+    positions = np.concatenate([positions for _, positions in broadcasts])
+    latest = len(agent_ids) - 1 - np.unique(agent_ids[::-1], return_index=True)[1]
+    return agent_ids[latest], positions[latest]
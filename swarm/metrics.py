@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class SafetyMetrics:
+    '''
+    Observer keeping running aggregates of how well the agents keep clear of each other and of the obstacles
+
+    Agents are discs of the agent radius. A pair collides while the discs overlap and is a near miss while they are less
+    than a safety radius apart without overlapping. An agent intrudes into an obstacle while its disc overlaps it.
+    Events are counted when a pair or intrusion starts and the *_ticks counts add up its duration in ticks. Only the
+    pairs and intrusions of the current tick are held, never a trajectory
+    '''
+    def __init__(self, terrain):
+        self.terrain = terrain
+        self.ticks = 0
+        self.min_separation = np.inf # closest approach of two agent centres, inf until a pair comes within near miss distance
+        self.min_separation_tick = None
+        self.collisions = 0
+        self.collision_ticks = 0
+        self.near_misses = 0
+        self.near_miss_ticks = 0
+        self.obstacle_intrusions = 0
+        self.intrusion_ticks = 0
+        self.colliding = np.empty(0, dtype=np.int64) # pair keys of the current tick
+        self.near = np.empty(0, dtype=np.int64)
+        self.intruding = np.empty(0, dtype=np.int64) # (agent, obstacle) keys of the current tick
+
+    def observe(self, simulation):
+        self.update(simulation.tick)
+
+    def safe_ticks(self, simulation) -> int:
+        # every tick is measured, including those an event-driven run skips over
+        return 1
+
+    def update(self, tick: int):
+        '''
+        Measure the swarm as it is at tick
+        '''
+        params = self.terrain.params
+        contact_distance = 2 * params.agent_radius
+        pairs, distances = self.terrain.neighbour_grid.pairs(contact_distance + params.safety_radius)
+        self.ticks += 1
+        if len(distances):
+            closest = int(np.argmin(distances))
+            if distances[closest] < self.min_separation:
+                self.min_separation = float(distances[closest])
+                self.min_separation_tick = tick
+
+        keys = pairs[:, 0] * self.terrain.swarm.size + pairs[:, 1]
+        colliding = np.sort(keys[distances < contact_distance])
+        near = np.sort(keys[distances >= contact_distance])
+        self.collisions += int(np.count_nonzero(~np.isin(colliding, self.colliding, assume_unique=True)))
+        self.near_misses += int(np.count_nonzero(~np.isin(near, self.near, assume_unique=True)))
+        self.collision_ticks += len(colliding)
+        self.near_miss_ticks += len(near)
+        self.colliding, self.near = colliding, near
+
+        positions = self.terrain.swarm.positions
+        agent_ids = np.flatnonzero(np.all(np.isfinite(positions), axis=1))
+        owners, obstacle_ids = self.terrain.obstacle_index.overlapping(positions[agent_ids], params.agent_radius)
+        intruding = np.unique(agent_ids[owners] * 2 ** 32 + obstacle_ids)
+        self.obstacle_intrusions += int(np.count_nonzero(~np.isin(intruding, self.intruding, assume_unique=True)))
+        self.intrusion_ticks += len(intruding)
+        self.intruding = intruding
+
+    def summary(self) -> dict:
+        return {
+            'ticks': self.ticks,
+            'min_separation': self.min_separation,
+            'min_separation_tick': self.min_separation_tick,
+            'collisions': self.collisions,
+            'collision_ticks': self.collision_ticks,
+            'near_misses': self.near_misses,
+            'near_miss_ticks': self.near_miss_ticks,
+            'obstacle_intrusions': self.obstacle_intrusions,
+            'intrusion_ticks': self.intrusion_ticks,
+        }
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class NeighbourGrid:
+    '''
+    Cell list over the positions of a swarm for radius and corridor queries
+
+    Every agent is binned into the square cell containing its position. Queries only visit the cells
+    overlapping the queried region and then filter the agents found there exactly
+    '''
+    def __init__(self, swarm, cell_size: float = None):
+        self.swarm = swarm
+        self.cell_size = cell_size if cell_size is not None else 2 * (swarm.params.agent_radius + swarm.params.safety_radius)
+        self.rebuild()
+
+    def cell_of(self, positions: np.ndarray) -> np.ndarray:
+        '''
+        Returns the (column, row) cell keys of positions. Non-finite positions are binned at the edges of the grid
+        '''
+        cells = np.clip(np.nan_to_num(positions / self.cell_size), -2 ** 29, 2 ** 29)
+        return np.floor(cells).astype(np.int64)
+
+    def rebuild(self):
+        '''
+        Bin every agent from scratch
+        '''
+        self.agent_cells = self.cell_of(self.swarm.positions)
+        self.cells = {}
+        for agent_id, cell in enumerate(map(tuple, self.agent_cells.tolist())):
+            self.cells.setdefault(cell, set()).add(agent_id)
+        # agents per occupied column and row, for the extent of the occupied cells
+        self.column_counts = dict(zip(*(array.tolist() for array in np.unique(self.agent_cells[:, 0], return_counts=True))))
+        self.row_counts = dict(zip(*(array.tolist() for array in np.unique(self.agent_cells[:, 1], return_counts=True))))
+
+    def update(self, agent_ids: np.ndarray = None):
+        '''
+        Re-bin the agents that moved into a different cell. Checks every agent if agent_ids is not given
+        '''
+        if agent_ids is None:
+            agent_ids = np.arange(self.swarm.size)
+        agent_ids = np.asarray(agent_ids, dtype=np.int64)
+        new_cells = self.cell_of(self.swarm.positions[agent_ids])
+        changed = np.any(new_cells != self.agent_cells[agent_ids], axis=1)
+        for agent_id, old_cell, new_cell in zip(agent_ids[changed].tolist(), self.agent_cells[agent_ids[changed]].tolist(), new_cells[changed].tolist()):
+            old_cell, new_cell = tuple(old_cell), tuple(new_cell)
+            self.cells[old_cell].discard(agent_id)
+            if not self.cells[old_cell]:
+                del self.cells[old_cell]
+            self.cells.setdefault(new_cell, set()).add(agent_id)
+            for counts, old, new in ((self.column_counts, old_cell[0], new_cell[0]), (self.row_counts, old_cell[1], new_cell[1])):
+                if old != new:
+                    counts[old] -= 1
+                    if not counts[old]:
+                        del counts[old]
+                    counts[new] = counts.get(new, 0) + 1
+        self.agent_cells[agent_ids[changed]] = new_cells[changed]
+
+    def cell_keys(self, cells: np.ndarray) -> np.ndarray:
+        '''
+        Returns a single sortable integer key for each (column, row) cell
+        '''
+        return (cells[:, 0] + 2 ** 30) * 2 ** 31 + (cells[:, 1] + 2 ** 30)
+
+    def candidates(self, x_min: float, x_max: float, y_min: float = -np.inf, y_max: float = np.inf) -> np.ndarray:
+        '''
+        Returns the ids of the agents in the cells overlapping a rectangle. Some may lie outside of it
+        '''
+        if not self.cells:
+            return np.empty(0, dtype=np.int64)
+        # unbounded sides are clamped to the occupied columns and rows
+        column_min = int(np.floor(x_min / self.cell_size)) if np.isfinite(x_min) else min(self.column_counts)
+        column_max = int(np.floor(x_max / self.cell_size)) if np.isfinite(x_max) else max(self.column_counts)
+        row_min = int(np.floor(y_min / self.cell_size)) if np.isfinite(y_min) else min(self.row_counts)
+        row_max = int(np.floor(y_max / self.cell_size)) if np.isfinite(y_max) else max(self.row_counts)
+        if column_min > column_max or row_min > row_max:
+            return np.empty(0, dtype=np.int64)
+
+        found = []
+        if (column_max - column_min + 1) * (row_max - row_min + 1) <= len(self.cells):
+            for column in range(column_min, column_max + 1):
+                for row in range(row_min, row_max + 1):
+                    found.extend(self.cells.get((column, row), ()))
+        else: # the region spans more cells than are occupied
+            for (column, row), agent_ids in self.cells.items():
+                if column_min <= column <= column_max and row_min <= row <= row_max:
+                    found.extend(agent_ids)
+        return np.array(found, dtype=np.int64)
+
+    def corridor(self, x_min: float, x_max: float, y_min: float = -np.inf, y_max: float = np.inf) -> np.ndarray:
+        '''
+        Returns the sorted ids of the agents with x_min <= x <= x_max and y_min <= y <= y_max
+        '''
+        agent_ids = self.candidates(x_min, x_max, y_min, y_max)
+        positions = self.swarm.positions[agent_ids]
+        inside = (positions[:, 0] >= x_min) & (positions[:, 0] <= x_max) & (positions[:, 1] >= y_min) & (positions[:, 1] <= y_max)
+        return np.sort(agent_ids[inside])
+
+    def radius(self, point: tuple, radius: float) -> np.ndarray:
+        '''
+        Returns the sorted ids of the agents within radius of point
+        '''
+        x, y = point
+        agent_ids = self.candidates(x - radius, x + radius, y - radius, y + radius)
+        offsets = self.swarm.positions[agent_ids] - (x, y)
+        inside = np.square(offsets[:, 0]) + np.square(offsets[:, 1]) <= np.square(radius)
+        return np.sort(agent_ids[inside])
+
+    def pairs(self, radius: float) -> tuple:
+        '''
+        Returns every pair of agents (i < j) closer than radius and their distances -> (pairs, distances)
+        '''
+        keys = self.cell_keys(self.agent_cells)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        reach = int(np.ceil(radius / self.cell_size))
+
+        firsts, seconds = [], []
+        for column_offset in range(reach + 1):
+            for row_offset in range(-reach, reach + 1):
+                if column_offset == 0 and row_offset < 0: # each pair of cells is only visited once
+                    continue
+                neighbour_keys = self.cell_keys(self.agent_cells + (column_offset, row_offset))
+                starts = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+                counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - starts
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                cell_firsts = np.repeat(np.arange(len(keys)), counts)
+                cell_seconds = order[np.repeat(starts, counts) + offsets]
+                if column_offset == 0 and row_offset == 0:
+                    same_cell = cell_firsts < cell_seconds
+                    cell_firsts, cell_seconds = cell_firsts[same_cell], cell_seconds[same_cell]
+                firsts.append(cell_firsts)
+                seconds.append(cell_seconds)
+
+        firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+        offsets = self.swarm.positions[firsts] - self.swarm.positions[seconds]
+        distances = np.sqrt(np.square(offsets[:, 0]) + np.square(offsets[:, 1]))
+        close = distances < radius
+        pairs = np.sort(np.stack([firsts[close], seconds[close]], axis=1), axis=1)
+        return pairs, distances[close]
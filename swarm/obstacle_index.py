@@ -0,0 +1,102 @@
+import numpy as np
+from swarm.params import Params
+
+
+class ObstacleIndex:
+    '''
+    Obstacles sorted by their y coordinate so that the ones within the panic window of an agent are found by bisection
+    '''
+    def __init__(self, obstacles: dict, params: Params = None):
+        self.params = params if params is not None else Params()
+        ids = np.fromiter(obstacles.keys(), dtype=np.int64, count=len(obstacles))
+        obstacles = np.array(list(obstacles.values()), dtype=float).reshape(-1, 4)
+        order = np.lexsort((ids, obstacles[:, 1]))
+        self.ids = ids[order] # obstacle ids (keys of the terrain's obstacles) in y order
+        self.ys = obstacles[order, 1]
+        self.left_xs = obstacles[order, 0]
+        self.right_xs = obstacles[order, 0] + obstacles[order, 2]
+        self.top_ys = obstacles[order, 1] + obstacles[order, 3]
+        self.max_height = float(np.max(obstacles[:, 3], initial=0))
+
+    def add(self, obstacle_ids: np.ndarray, obstacles: np.ndarray):
+        '''
+        Insert obstacles, keeping the y order
+        '''
+        obstacle_ids = np.asarray(obstacle_ids, dtype=np.int64).reshape(-1)
+        obstacles = np.asarray(obstacles, dtype=float).reshape(-1, 4)
+        ids = np.concatenate([self.ids, obstacle_ids])
+        ys = np.concatenate([self.ys, obstacles[:, 1]])
+        order = np.lexsort((ids, ys))
+        self.ids = ids[order]
+        self.ys = ys[order]
+        self.left_xs = np.concatenate([self.left_xs, obstacles[:, 0]])[order]
+        self.right_xs = np.concatenate([self.right_xs, obstacles[:, 0] + obstacles[:, 2]])[order]
+        self.top_ys = np.concatenate([self.top_ys, obstacles[:, 1] + obstacles[:, 3]])[order]
+        self.max_height = max(self.max_height, float(np.max(obstacles[:, 3], initial=0)))
+
+    def remove(self, obstacle_ids: np.ndarray):
+        kept = ~np.isin(self.ids, obstacle_ids)
+        self.ids = self.ids[kept]
+        self.ys = self.ys[kept]
+        self.left_xs = self.left_xs[kept]
+        self.right_xs = self.right_xs[kept]
+        self.top_ys = self.top_ys[kept]
+        self.max_height = float(np.max(self.top_ys - self.ys, initial=0))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def window(self, y: float) -> tuple:
+        '''
+        Returns the [start, stop) range of sorted obstacles within the panic window of y
+        '''
+        start = np.searchsorted(self.ys, y - self.params.obstacle_panic_act_distance, side='left')
+        stop = np.searchsorted(self.ys, y + self.params.obstacle_panic_act_distance, side='right')
+        return start, stop
+
+    def blocking(self, position: tuple) -> np.ndarray:
+        '''
+        Returns the ids of the obstacles blocking an agent at position, in id order
+        '''
+        x, y = position
+        start, stop = self.window(y)
+        in_x_range = (x > self.left_xs[start:stop] - self.params.agent_radius) & (x < self.right_xs[start:stop] + self.params.agent_radius)
+        return np.sort(self.ids[start:stop][in_x_range])
+
+    def blocking_many(self, positions: np.ndarray) -> list:
+        '''
+        Returns the ids of the obstacles blocking each agent at positions, in id order, from one batched query
+        '''
+        starts, stops = self.window(positions[:, 1])
+        counts = stops - starts
+
+        # flatten every agent's candidate range into one array of sorted obstacle indices
+        owners = np.repeat(np.arange(len(positions)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = np.repeat(starts, counts) + offsets
+
+        candidate_xs = positions[owners, 0]
+        in_x_range = (candidate_xs > self.left_xs[candidates] - self.params.agent_radius) & (candidate_xs < self.right_xs[candidates] + self.params.agent_radius)
+        owners, ids = owners[in_x_range], self.ids[candidates[in_x_range]]
+
+        # group by agent then by id
+        order = np.lexsort((ids, owners))
+        owners, ids = owners[order], ids[order]
+        return np.split(ids, np.searchsorted(owners, np.arange(1, len(positions))))
+
+    def overlapping(self, positions: np.ndarray, radius: float) -> tuple:
+        '''
+        Returns every (position index, obstacle id) pair of a disc of radius at a position overlapping an obstacle
+        '''
+        starts = np.searchsorted(self.ys, positions[:, 1] - radius - self.max_height, side='left')
+        stops = np.searchsorted(self.ys, positions[:, 1] + radius, side='left')
+        counts = np.maximum(stops - starts, 0)
+        owners = np.repeat(np.arange(len(positions)), counts)
+        candidates = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+
+        # distance from each disc centre to the closest point of the candidate obstacle
+        xs, ys = positions[owners, 0], positions[owners, 1]
+        dx = np.maximum(np.maximum(self.left_xs[candidates] - xs, xs - self.right_xs[candidates]), 0)
+        dy = np.maximum(np.maximum(self.ys[candidates] - ys, ys - self.top_ys[candidates]), 0)
+        overlap = np.square(dx) + np.square(dy) < np.square(radius)
+        return owners[overlap], self.ids[candidates[overlap]]
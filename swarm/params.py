@@ -0,0 +1,47 @@
+import config as cf
+
+
+# the config.py constant each parameter defaults to
+DEFAULTS = {
+    'safety_radius': 'SAFETY_RADIUS',
+    'agent_radius': 'AGENT_RADIUS',
+    'obstacle_allowance': 'OBSTACLE_ALLOWANCE',
+    'obstacle_panic_act_distance': 'OBSTACLE_PANIC_ACT_DISTANCE',
+    'nominal_velocity': 'NOMINAL_VELOCITY',
+    'maximum_velocity': 'MAXIMUM_VELOCITY',
+}
+
+
+class Params:
+    '''
+    The tuning knobs of one simulation. Any not given default to their config.py constant
+
+    Params are immutable, so a terrain and everything built from it keep agreeing on them
+    '''
+    def __init__(self, **values):
+        unknown = set(values) - set(DEFAULTS)
+        if unknown:
+            raise TypeError(f'unknown parameters {sorted(unknown)}')
+        for name, constant in DEFAULTS.items():
+            object.__setattr__(self, name, float(values.get(name, getattr(cf, constant))))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Params are immutable, use replace()')
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in DEFAULTS}
+
+    def replace(self, **changes) -> 'Params':
+        '''
+        Returns a copy with some parameters changed
+        '''
+        return Params(**{**self.as_dict(), **changes})
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Params) and self.as_dict() == other.as_dict()
+
+    def __hash__(self) -> int:
+        return hash(tuple(self.as_dict().values()))
+
+    def __repr__(self) -> str:
+        return 'Params(' + ', '.join(f'{name}={value!r}' for name, value in self.as_dict().items()) + ')'
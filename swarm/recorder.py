@@ -0,0 +1,134 @@
+import os
+import json
+import numpy as np
+
+
+# column name -> (dtype, per-agent shape). Every column is stored as a raw (ticks, agents, *shape) array
+COLUMNS = {
+    'positions': (np.float32, (2,)),
+    'titters': (np.float32, ()),
+    'velocities': (np.float32, ()),
+    'states': (np.int16, ()),
+    'directive_types': (np.int16, ()),
+}
+METADATA_FILE = 'trajectory.json'
+
+
+class TrajectoryRecorder:
+    '''
+    Streams the per-tick state of a swarm to one append-only binary file per column
+
+    Only a chunk of chunk_ticks ticks is held in memory before it is appended to disk
+    '''
+    def __init__(self, directory: str, agents: int, chunk_ticks: int = 64):
+        self.directory = directory
+        self.agents = agents
+        self.chunk_ticks = chunk_ticks
+        self.ticks = 0
+        os.makedirs(directory, exist_ok=True)
+        self.files = {name: open(os.path.join(directory, f'{name}.bin'), 'wb') for name in COLUMNS}
+        self.tick_file = open(os.path.join(directory, 'ticks.bin'), 'wb')
+        self.chunk = {name: np.empty((chunk_ticks, agents) + shape, dtype=dtype) for name, (dtype, shape) in COLUMNS.items()}
+        self.chunk_tick_numbers = np.empty(chunk_ticks, dtype=np.int64)
+        self.chunk_length = 0
+        self.write_metadata()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def observe(self, simulation):
+        '''
+        Record the state of the simulation's swarm at its current tick
+        '''
+        self.record(simulation.tick, simulation.terrain.swarm)
+
+    def record(self, tick: int, swarm):
+        '''
+        Append the state of a swarm at a tick
+        '''
+        for name in COLUMNS:
+            self.chunk[name][self.chunk_length] = getattr(swarm, name)
+        self.chunk_tick_numbers[self.chunk_length] = tick
+        self.chunk_length += 1
+        if self.chunk_length == self.chunk_ticks:
+            self.flush()
+
+    def flush(self):
+        '''
+        Append the buffered ticks to disk
+        '''
+        if not self.chunk_length:
+            return
+        for name, file in self.files.items():
+            file.write(self.chunk[name][:self.chunk_length].tobytes())
+            file.flush()
+        self.tick_file.write(self.chunk_tick_numbers[:self.chunk_length].tobytes())
+        self.tick_file.flush()
+        self.ticks += self.chunk_length
+        self.chunk_length = 0
+        self.write_metadata()
+
+    def write_metadata(self):
+        '''
+        Describe the flushed columns so a reader can map them
+        '''
+        metadata = {
+            'ticks': self.ticks,
+            'agents': self.agents,
+            'columns': {name: {'dtype': np.dtype(dtype).str, 'shape': list(shape)} for name, (dtype, shape) in COLUMNS.items()},
+        }
+        with open(os.path.join(self.directory, METADATA_FILE), 'w') as file:
+            json.dump(metadata, file)
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+        self.tick_file.close()
+
+
+class TrajectoryReader:
+    '''
+    Memory-maps a trajectory written by TrajectoryRecorder so that it can be sliced without loading it
+    '''
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, METADATA_FILE)) as file:
+            metadata = json.load(file)
+        self.ticks = metadata['ticks']
+        self.agents = metadata['agents']
+        self.columns = {}
+        for name, column in metadata['columns'].items():
+            shape = (self.ticks, self.agents) + tuple(column['shape'])
+            self.columns[name] = self._map(f'{name}.bin', np.dtype(column['dtype']), shape)
+        self.tick_numbers = self._map('ticks.bin', np.dtype(np.int64), (self.ticks,))
+
+    def _map(self, file_name: str, dtype: np.dtype, shape: tuple) -> np.ndarray:
+        if not self.ticks: # empty files cannot be memory-mapped
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, file_name), dtype=dtype, mode='r', shape=shape)
+
+    def __len__(self) -> int:
+        return self.ticks
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def tick_range(self, start: int, stop: int) -> slice:
+        '''
+        Returns the rows holding the recorded ticks start <= tick < stop
+        '''
+        return slice(np.searchsorted(self.tick_numbers, start, side='left'), np.searchsorted(self.tick_numbers, stop, side='left'))
+
+    def slice(self, start: int = 0, stop: int = None, agent_ids=None) -> dict:
+        '''
+        Returns every column for the ticks start <= tick < stop of the given agents (all of them if not given)
+        '''
+        rows = self.tick_range(start, stop if stop is not None else np.iinfo(np.int64).max)
+        data = {'ticks': np.array(self.tick_numbers[rows])}
+        for name, column in self.columns.items():
+            data[name] = np.array(column[rows] if agent_ids is None else column[rows][:, agent_ids])
+        return data
@@ -0,0 +1,125 @@
+import os
+import subprocess
+import multiprocessing
+import numpy as np
+import config as cf
+import matplotlib.animation as animation
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.patches import Rectangle
+from swarm.recorder import TrajectoryReader
+
+
+class Renderer:
+    '''
+    Draws an obstacle course and the agents on it with matplotlib
+
+    The obstacles are drawn once into a cached background and only the agent markers are redrawn per frame
+    '''
+    def __init__(self, width: float, height: float, obstacles: list, agent_radius: float = cf.AGENT_RADIUS):
+        # create and configure plot
+        self.plot_figure = Figure(facecolor='white', figsize=(2, 2), dpi=300, frameon=True)
+        self.canvas = FigureCanvasAgg(self.plot_figure)
+        self.plot_axis = self.plot_figure.add_subplot()
+        self.plot_axis.set_ylim(0, height)
+        self.plot_axis.set_xlim(0, width)
+        self.plot_axis.yaxis.set_visible(False)
+        self.plot_axis.xaxis.set_visible(False)
+        self.plot_axis.spines['top'].set_visible(False)
+        self.plot_axis.spines['bottom'].set_visible(False)
+        self.plot_axis.set_facecolor('#8cc63f')
+
+        rectangles = [Rectangle((x, y), dx, dy) for x, y, dx, dy in obstacles]
+        self.plot_axis.add_collection(PatchCollection(rectangles, fc='#764c29', ec='black', lw=0.484))
+        self.agent_markers, = self.plot_axis.plot([], [], 'o', markersize= 2 * agent_radius, c='#2e3192', animated=True)
+        self.background = None
+
+    @classmethod
+    def from_terrain(cls, terrain):
+        return cls(terrain.width, terrain.height, list(terrain.obstacles.values()), terrain.params.agent_radius)
+
+    @property
+    def frame_size(self) -> tuple:
+        '''(width, height) of a frame in pixels'''
+        return self.canvas.get_width_height()
+
+    def update_agents(self, positions: np.ndarray) -> list:
+        '''
+        Move the agent markers to positions. Returns the updated artists
+        '''
+        self.agent_markers.set_data(positions[:, 0], positions[:, 1])
+        return [self.agent_markers]
+
+    def draw(self, positions: np.ndarray) -> bytes:
+        '''
+        Render a frame of the agents at positions -> raw RGBA bytes
+        '''
+        if self.background is None:
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.plot_figure.bbox)
+        self.canvas.restore_region(self.background)
+        self.update_agents(positions)
+        self.plot_axis.draw_artist(self.agent_markers)
+        return bytes(self.canvas.buffer_rgba())
+
+    def animate(self, simulation, path: str = 'output/swarm-control.mp4', frames: int = 200, fps: int = 20):
+        '''
+        Advance a simulation frame by frame and render it to a video file
+        '''
+        def plot_frame(animation_index):
+            simulation.step()
+            return self.update_agents(simulation.terrain.swarm.positions)
+
+        make_output_directory(path)
+        anim = animation.FuncAnimation(self.plot_figure, plot_frame, init_func=lambda: self.update_agents(simulation.terrain.swarm.positions),
+                                       frames=frames, interval=cf.TRANSLATION_INTERVAL * 1000, blit=True)
+        anim.save(path, writer = 'ffmpeg', fps = fps)
+
+
+def make_output_directory(path: str):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+
+
+# per-process renderer and trajectory of render_video's workers
+_worker_renderer = None
+_worker_positions = None
+
+
+def _start_worker(width: float, height: float, obstacles: list, agent_radius: float, trajectory):
+    global _worker_renderer, _worker_positions
+    _worker_renderer = Renderer(width, height, obstacles, agent_radius)
+    _worker_positions = TrajectoryReader(trajectory)['positions'] if isinstance(trajectory, str) else trajectory
+
+
+def _render_frames(frame_range: tuple) -> bytes:
+    start, stop = frame_range
+    return b''.join(_worker_renderer.draw(positions) for positions in _worker_positions[start:stop])
+
+
+def render_video(path: str, trajectory, width: float, height: float, obstacles: list, fps: int = 20, processes: int = None, chunk_frames: int = 32, ffmpeg: str = 'ffmpeg', agent_radius: float = cf.AGENT_RADIUS):
+    '''
+    Render a trajectory to a video file, drawing frames across worker processes and piping them straight to ffmpeg
+
+    trajectory is either a (ticks, agents, 2) array of positions or the directory of a recorded trajectory,
+    which every worker memory-maps on its own. ffmpeg is the path of an installed ffmpeg executable with libx264,
+    e.g. the one the imageio-ffmpeg package provides through imageio_ffmpeg.get_ffmpeg_exe()
+    '''
+    frames = len(TrajectoryReader(trajectory)) if isinstance(trajectory, str) else len(trajectory)
+    frame_width, frame_height = Renderer(width, height, obstacles, agent_radius).frame_size
+    make_output_directory(path)
+    encoder = subprocess.Popen([
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f'{frame_width}x{frame_height}', '-r', str(fps), '-i', '-',
+        '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', path,
+    ], stdin=subprocess.PIPE)
+    frame_ranges = [(start, min(start + chunk_frames, frames)) for start in range(0, frames, chunk_frames)]
+    try:
+        with multiprocessing.Pool(processes or os.cpu_count(), initializer=_start_worker, initargs=(width, height, obstacles, agent_radius, trajectory)) as pool:
+            for frame_chunk in pool.imap(_render_frames, frame_ranges): # imap keeps the frames in order
+                encoder.stdin.write(frame_chunk)
+    finally:
+        encoder.stdin.close()
+        encoder.wait()
@@ -0,0 +1,258 @@
+import io
+import json
+import numpy as np
+import config as cf
+from swarm.terrain import Terrain
+from swarm.instrumentation import NULL_INSTRUMENTATION
+from swarm.events import ticks_to_next_event
+from swarm.message_bus import MessageBus, DISTRESS
+from swarm.params import Params
+
+# instrumentation counter name of each distress type
+DISTRESS_COUNTERS = {
+    cf.DISTRESS_OBSTACLE_FOUND_SAFETY: 'distress_found_safety',
+    cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY: 'distress_not_found_safety',
+}
+
+
+def _pack_arrays(value, name: str, arrays: dict):
+    '''
+    Move the arrays nested in a state into arrays, keyed by their path, leaving {'__array__': path} in their place
+    '''
+    if isinstance(value, np.ndarray):
+        arrays[name] = value
+        return {'__array__': name}
+    if isinstance(value, dict):
+        return {key: _pack_arrays(item, f'{name}.{key}' if name else key, arrays) for key, item in value.items()}
+    return value
+
+
+def _unpack_arrays(value, arrays):
+    '''
+    Put the arrays moved out by _pack_arrays back in place
+    '''
+    if isinstance(value, dict):
+        if set(value) == {'__array__'}:
+            return arrays[value['__array__']]
+        return {key: _unpack_arrays(item, arrays) for key, item in value.items()}
+    return value
+
+
+class Simulation:
+    '''
+    Headless driver that advances a terrain's swarm one translation interval at a time
+    '''
+    def __init__(self, terrain: Terrain, observers: list = None, instrumentation=None, bus: MessageBus = None):
+        self.terrain = terrain
+        self.bus = bus # carries the agents' messages in step_async
+        terrain.bus = bus
+        self.observers = observers or [] # notified through observe(simulation) after every step
+        self.instrumentation = instrumentation or NULL_INSTRUMENTATION
+        self.tick = 0
+        self.distress_counts = {cf.DISTRESS_OBSTACLE_FOUND_SAFETY: 0, cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY: 0}
+        self.halts = 0 # times an agent was brought to a halt by a distressed agent that found no safety point
+        self.cruise = None # (first tick, last tick, anchor positions, anchor steps, anchor displacements) of the last skipped stretch of ticks
+
+    @property
+    def time(self) -> float:
+        '''Elapsed simulation time in seconds'''
+        return self.tick * cf.TRANSLATION_INTERVAL
+
+    @property
+    def completed(self) -> bool:
+        '''Has every agent traversed the terrain?'''
+        return bool(np.all(self.terrain.swarm.positions[:, 1] >= self.terrain.height))
+
+    @property
+    def diverged(self) -> bool:
+        '''Has any agent's position become non-finite?'''
+        return not bool(np.all(np.isfinite(self.terrain.swarm.positions)))
+
+    def step(self):
+        '''
+        Advance the swarm by one translation interval. Every distress raised in the tick is resolved together
+        '''
+        instrumentation = self.instrumentation
+        with instrumentation.phase('sense', self.tick):
+            distress_messages = self.sense()
+        with instrumentation.phase('distress', self.tick):
+            self.resolve(distress_messages)
+        with instrumentation.phase('translate', self.tick):
+            self.translate()
+        self.tick += 1
+        for observer in self.observers:
+            observer.observe(self)
+
+    async def step_async(self):
+        '''
+        Advance the swarm by one translation interval, sending the agents' distress and position messages over the bus.
+        The distress messages delivered in the tick are resolved together
+        '''
+        if self.bus is None:
+            raise ValueError('step_async sends messages over a bus, construct the simulation with one')
+        instrumentation = self.instrumentation
+        with instrumentation.phase('sense', self.tick):
+            for distress_data in self.sense():
+                self.terrain.agents[distress_data['agent_id']].transmit_distress(distress_data)
+            # one bulk broadcast of every agent's position keeps the bus fast for large swarms
+            self.bus.publish_positions(np.arange(len(self.terrain.agents)), self.terrain.swarm.positions)
+        with instrumentation.phase('distress', self.tick):
+            delivered = await self.bus.flush(self.tick)
+            self.resolve(delivered[DISTRESS])
+        with instrumentation.phase('translate', self.tick):
+            self.translate()
+        self.tick += 1
+        for observer in self.observers:
+            observer.observe(self)
+
+    async def run_async(self, ticks: int):
+        '''
+        Advance the swarm by a number of translation intervals over the bus
+        '''
+        for _ in range(ticks):
+            await self.step_async()
+
+    def sense(self) -> list:
+        '''
+        Scan the terrain for every agent that can sense. Returns the distress messages raised
+
+        Every agent is checked for obstacles where it is when its turn comes. A distress pushes the agents ahead of the
+        distressed agent clear of it, so the agents pushed after the batched query are queried again
+        '''
+        swarm = self.terrain.swarm
+        swarm.directive_types[:] = cf.DISTRESS_NONE
+        sensing_ids = np.flatnonzero(swarm.can_sense)
+        queried_positions = swarm.positions[sensing_ids]
+        blocking_ids = self.terrain.obstacle_index.blocking_many(queried_positions)
+        distress_messages = []
+        for agent_id, obstacle_ids, queried_position in zip(sensing_ids, blocking_ids, queried_positions):
+            if distress_messages and not np.array_equal(swarm.positions[agent_id], queried_position):
+                obstacle_ids = self.terrain.obstacle_index.blocking(swarm.positions[agent_id])
+            if len(obstacle_ids):
+                distress_messages.append(self.terrain.agents[agent_id].distress_data(obstacle_ids))
+        return distress_messages
+
+    def resolve(self, distress_messages: list):
+        '''
+        Resolve the distress messages of a tick and apply the resulting directives to the swarm
+        '''
+        if distress_messages:
+            resolved = self.terrain.resolve_distress(distress_messages)
+            for distress_type, counter in DISTRESS_COUNTERS.items():
+                count = int(np.count_nonzero(resolved['type'] == distress_type))
+                self.distress_counts[distress_type] += count
+                if count:
+                    self.instrumentation.count(counter, count, self.tick)
+            self.halts += len(resolved['halted'])
+            if len(resolved['halted']):
+                self.instrumentation.count('halts', len(resolved['halted']), self.tick)
+            self.terrain.swarm.apply_directives(resolved['agent_ids'], resolved['vr'], resolved['titter'], resolved['type'])
+
+    def translate(self):
+        '''
+        Translate the swarm and re-bin the agents that moved into another cell
+        '''
+        self.terrain.swarm.translate()
+        self.terrain.neighbour_grid.update()
+
+    def state(self) -> dict:
+        '''
+        Returns the state of the terrain and of the run so far. The arrays are not copied
+        '''
+        state = self.terrain.state()
+        state.update({
+            'tick': self.tick,
+            'distress_counts': {str(distress_type): count for distress_type, count in self.distress_counts.items()},
+            'halts': self.halts,
+        })
+        if self.cruise is not None:
+            (state['cruise_tick'], state['cruise_end_tick'], state['cruise_anchor_positions'], state['cruise_anchor_steps'],
+             state['cruise_anchor_displacements']) = self.cruise
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict, observers: list = None, instrumentation=None, bus: MessageBus = None, params: Params = None) -> 'Simulation':
+        '''
+        Returns a simulation in the given state, optionally with other parameters
+        '''
+        simulation = cls(Terrain.from_state(state, params), observers, instrumentation, bus)
+        simulation.tick = int(state['tick'])
+        simulation.distress_counts = {int(distress_type): int(count) for distress_type, count in state['distress_counts'].items()}
+        simulation.halts = int(state['halts'])
+        if 'cruise_tick' in state:
+            simulation.cruise = (int(state['cruise_tick']), int(state['cruise_end_tick']), np.array(state['cruise_anchor_positions']),
+                                 np.array(state['cruise_anchor_steps']), np.array(state['cruise_anchor_displacements']))
+        return simulation
+
+    def snapshot(self) -> bytes:
+        '''
+        Serialize the state of the simulation to a compressed npz archive
+
+        Observers, instrumentation and the message bus are not part of the state
+        '''
+        arrays = {}
+        metadata = _pack_arrays(self.state(), '', arrays)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, metadata=np.array(json.dumps(metadata)), **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def restore(cls, snapshot: bytes, observers: list = None, instrumentation=None, bus: MessageBus = None, params: Params = None) -> 'Simulation':
+        '''
+        Returns the simulation a snapshot was taken of, optionally with other parameters
+        '''
+        with np.load(io.BytesIO(snapshot)) as archive:
+            state = _unpack_arrays(json.loads(str(archive['metadata'])), archive)
+        return cls.from_state(state, observers, instrumentation, bus, params)
+
+    def fork(self, observers: list = None, bus: MessageBus = None, params: Params = None) -> 'Simulation':
+        '''
+        Returns an independent copy of the simulation from which a branch of the run can continue
+
+        Only arrays are copied. Observers are bound to a terrain, so the fork gets new ones
+        '''
+        return Simulation.from_state(self.state(), observers, self.instrumentation, bus, params)
+
+    def skip(self, ticks: int):
+        '''
+        Advance a swarm that is cruising (see events.ticks_to_next_event) by a number of ticks in one jump
+        '''
+        swarm = self.terrain.swarm
+        swarm.directive_types[:] = cf.DISTRESS_NONE
+        swarm.advance(ticks)
+        # the agents keep their anchors over the stretch, so its positions are recomputed exactly as ticks would give them
+        self.cruise = (self.tick, self.tick + ticks, swarm.anchor_positions.copy(), swarm.anchor_steps - ticks, swarm.anchor_displacements.copy())
+        self.terrain.neighbour_grid.update()
+        self.tick += ticks
+        self.instrumentation.count('skipped_ticks', ticks, self.tick)
+        for observer in self.observers:
+            observer.observe(self)
+
+    def positions_at(self, tick: float) -> np.ndarray:
+        '''
+        Returns the positions of the swarm at a past tick of the last skipped stretch, or at the current tick
+        '''
+        if tick == self.tick:
+            return self.terrain.swarm.positions.copy()
+        if self.cruise is None or not self.cruise[0] <= tick <= self.cruise[1]:
+            raise ValueError(f'tick {tick} is not within the last skipped stretch of ticks')
+        first_tick, _, anchor_positions, anchor_steps, anchor_displacements = self.cruise
+        return anchor_positions + (anchor_steps + (tick - first_tick))[:, np.newaxis] * anchor_displacements
+
+    def run(self, ticks: int, event_driven: bool = False, max_skip: int = 10000):
+        '''
+        Advance the swarm by a number of translation intervals
+
+        If event_driven, stretches of ticks in which no agent needs a new directive are skipped in one jump of at most max_skip
+        ticks, or of as many as every observer's safe_ticks(simulation) allows. The state at every stepped tick matches a
+        tick-by-tick run, but observers are only notified at those ticks
+        '''
+        end_tick = self.tick + ticks
+        while self.tick < end_tick:
+            if event_driven:
+                horizon = min([max_skip, end_tick - self.tick] + [observer.safe_ticks(self) for observer in self.observers if hasattr(observer, 'safe_ticks')])
+                cruising_ticks = ticks_to_next_event(self.terrain, horizon)
+                if cruising_ticks:
+                    self.skip(cruising_ticks)
+                    continue
+            self.step()
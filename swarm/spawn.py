@@ -0,0 +1,102 @@
+import numpy as np
+from swarm.params import Params
+from util.exceptions import SpawnRegionError
+
+
+SPAWN_BAND_TOP = 10 # metres # random obstacles are placed above the spawn band
+FORMATIONS = ('random', 'line', 'wedge', 'grid')
+FIT_TOLERANCE = 1e-9
+
+
+def spacing(params: Params) -> float:
+    '''
+    Closest two agents may spawn: their safety radii must not overlap
+    '''
+    return 2 * (params.agent_radius + params.safety_radius)
+
+
+def default_region(count: int, width: float, params: Params, formation: str = 'random') -> tuple:
+    '''
+    Returns the (x_min, y_min, x_max, y_max) region of agent centres below the spawn band top. A swarm too large for the
+    band extends back beyond the start of the terrain
+    '''
+    x_min, x_max = params.agent_radius, width - params.agent_radius
+    y_max = SPAWN_BAND_TOP - params.agent_radius
+    if formation == 'random':
+        columns = max(1, int(np.floor((x_max - x_min) / spacing(params) + FIT_TOLERANCE)))
+        depth = int(np.ceil(count / columns)) * spacing(params)
+    else:
+        depth = formation_offsets(count, formation, spacing(params), x_max - x_min)[:, 1].max(initial=0)
+    return x_min, min(params.agent_radius, y_max - depth), x_max, y_max
+
+
+def spawn_positions(count: int, region: tuple, params: Params, formation: str = 'random', rng: np.random.Generator = None) -> np.ndarray:
+    '''
+    Returns count non-overlapping agent positions within the (x_min, y_min, x_max, y_max) region
+
+    random scatters the agents over the region, line places them abreast, wedge in a triangle led by one agent
+    and grid in a square block. Formations are centred on the region's x and start at its back
+    '''
+    if formation not in FORMATIONS:
+        raise ValueError(f'unknown formation {formation!r}, expected one of {FORMATIONS}')
+    if formation == 'random':
+        return jittered_grid(count, region, spacing(params), rng if rng is not None else np.random.default_rng())
+    x_min, y_min, x_max, y_max = region
+    offsets = formation_offsets(count, formation, spacing(params), x_max - x_min)
+    if not count:
+        return offsets
+    extent = offsets.max(axis=0)
+    if extent[0] > x_max - x_min + FIT_TOLERANCE or extent[1] > y_max - y_min + FIT_TOLERANCE:
+        raise SpawnRegionError(f'a {formation} of {count} agents spans {extent[0]:.1f} x {extent[1]:.1f} metres, more than the spawn region')
+    return offsets + ((x_min + x_max - extent[0]) / 2, y_min)
+
+
+def formation_offsets(count: int, formation: str, pitch: float, width: float) -> np.ndarray:
+    '''
+    Returns the offsets of count agents pitch apart in a line, wedge or grid formation from its back left corner.
+    A grid is made no wider than width where it can be
+    '''
+    if formation == 'line':
+        offsets = np.stack([np.arange(count) * pitch, np.zeros(count)], axis=1)
+    elif formation == 'wedge':
+        # rank r of the triangular lattice holds r + 1 agents, the leader alone at the front
+        ranks = np.floor((np.sqrt(8 * np.arange(count) + 1) - 1) / 2).astype(np.int64)
+        ranks += (ranks + 1) * (ranks + 2) // 2 <= np.arange(count) # undo rounding of the square root
+        files = np.arange(count) - ranks * (ranks + 1) // 2
+        depth = ranks[-1] if count else 0
+        offsets = np.stack([(files - ranks / 2) * pitch, (depth - ranks) * pitch * np.sqrt(3) / 2], axis=1)
+    else:
+        columns = max(1, min(int(np.ceil(np.sqrt(count))), int(np.floor(width / pitch + FIT_TOLERANCE)) + 1))
+        rows, files = np.divmod(np.arange(count), columns)
+        offsets = np.stack([files * pitch, rows * pitch], axis=1).astype(float)
+    offsets = offsets.reshape(-1, 2)
+    return offsets - offsets.min(axis=0) if count else offsets
+
+
+def jittered_grid(count: int, region: tuple, min_distance: float, rng: np.random.Generator) -> np.ndarray:
+    '''
+    Returns count random positions within region, no two closer than min_distance
+
+    The region is cut into the largest square cells that still give enough cells, a random subset of cells gets an agent
+    and each agent is jittered within its cell by at most the cell's slack over min_distance
+    '''
+    x_min, y_min, x_max, y_max = region
+    width, height = x_max - x_min, y_max - y_min
+
+    def cell_count(pitch):
+        return np.floor(width / pitch + FIT_TOLERANCE) * np.floor(height / pitch + FIT_TOLERANCE)
+
+    if cell_count(min_distance) < count:
+        raise SpawnRegionError(f'{count} agents {min_distance} metres apart do not fit in a {width:.1f} x {height:.1f} metre spawn region')
+    low, high = min_distance, max(min_distance, width, height) # cell_count(low) >= count
+    for _ in range(60):
+        pitch = (low + high) / 2
+        low, high = (pitch, high) if cell_count(pitch) >= count else (low, pitch)
+    pitch = low
+
+    columns = int(np.floor(width / pitch + FIT_TOLERANCE))
+    cells = np.sort(rng.choice(int(cell_count(pitch)), size=count, replace=False))
+    rows, files = np.divmod(cells, columns)
+    slack = (pitch - min_distance) / 2
+    centres = np.stack([x_min + (files + 0.5) * pitch, y_min + (rows + 0.5) * pitch], axis=1)
+    return centres + rng.uniform(-slack, slack, size=(count, 2))
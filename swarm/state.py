@@ -0,0 +1,125 @@
+import numpy as np
+import config as cf
+from swarm.params import Params
+
+
+# agent state each directive type puts an agent in
+DIRECTIVE_STATES = {
+    cf.DISTRESS_OBSTACLE_FOUND_SAFETY: cf.DODGING_OBSTACLE,
+    cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY: cf.SEARCHING_FOR_HOLE,
+}
+
+
+class SwarmState:
+    '''
+    Struct-of-arrays storage for every agent in a swarm. Row i holds the data of the agent with id i
+    '''
+    ARRAYS = ('positions', 'velocities', 'titters', 'states', 'directive_types', 'halted', 'can_sense', 'safety_positions', 'has_safety',
+              'anchor_positions', 'anchor_displacements', 'anchor_steps')
+
+    def __init__(self, size: int, params: Params = None):
+        self.size = size
+        self.params = params if params is not None else Params()
+        self.positions = np.zeros((size, 2))
+        self.velocities = np.full(size, float(self.params.nominal_velocity))
+        self.titters = np.full(size, float(cf.NOMINAL_TITTER)) # degrees
+        self.states = np.full(size, cf.FORWARD_TRANSLATION, dtype=np.int16)
+        self.directive_types = np.full(size, cf.DISTRESS_NONE, dtype=np.int16) # directive received in the current tick
+        self.halted = np.zeros(size, dtype=bool)
+        self.can_sense = np.ones(size, dtype=bool)
+        self.safety_positions = np.zeros((size, 2))
+        self.has_safety = np.zeros(size, dtype=bool)
+        # every agent moves along a straight line from an anchor: position = anchor + steps * displacement
+        self.anchor_positions = np.zeros((size, 2))
+        self.anchor_displacements = np.zeros((size, 2))
+        self.anchor_steps = np.zeros(size, dtype=np.int64)
+
+    @classmethod
+    def from_arrays(cls, arrays: dict, params: Params = None) -> 'SwarmState':
+        '''
+        Returns a swarm holding copies of the arrays named in ARRAYS
+        '''
+        swarm = cls(len(arrays['positions']), params)
+        for name in cls.ARRAYS:
+            getattr(swarm, name)[:] = arrays[name]
+        return swarm
+
+    def velocity_components(self) -> tuple:
+        '''
+        Returns the x and y velocity components of every agent
+        '''
+        radians = self.titters / (180 / np.pi)
+        return self.velocities * np.cos(radians), self.velocities * np.sin(radians)
+
+    def time_to_arrive(self, agent_ids: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        '''
+        How long before the forward-tip of each agent's safety radius reaches its destination
+        '''
+        offsets = self.positions[agent_ids] - destinations
+        distances_to_destinations = np.sqrt(np.square(offsets[:, 0]) - np.square(offsets[:, 1])) - self.params.safety_radius
+        return distances_to_destinations / self.velocities[agent_ids]
+
+    def time_to_clear(self, agent_ids: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        '''
+        How long before the rear-tip of each agent's safety radius exits its destination
+        '''
+        offsets = self.positions[agent_ids] - destinations
+        distances_to_destinations = np.sqrt(np.square(offsets[:, 0]) - np.square(offsets[:, 1])) + self.params.safety_radius
+        return distances_to_destinations / self.velocities[agent_ids]
+
+    def reached_safety(self) -> np.ndarray:
+        '''
+        Reset the velocity vector of agents that have passed their safety point to nominal. Returns their mask
+        '''
+        reached = self.has_safety \
+            & (self.positions[:, 0] >= self.safety_positions[:, 0] + 0.01) \
+            & (self.positions[:, 1] >= self.safety_positions[:, 1] + 0.01)
+        self.velocities[reached] = self.params.nominal_velocity
+        self.titters[reached] = cf.NOMINAL_TITTER
+        self.states[reached] = cf.FORWARD_TRANSLATION
+        self.has_safety[reached] = False
+        return reached
+
+    def displacements(self) -> np.ndarray:
+        '''
+        Returns how far every agent moves in a translation interval at its current velocity facing its titter
+        '''
+        velocity_x_component, velocity_y_component = self.velocity_components()
+        # recall s = vt
+        displacements = np.stack([velocity_x_component, velocity_y_component], axis=1) * cf.TRANSLATION_INTERVAL
+        displacements[self.halted] = 0
+        return displacements
+
+    def advance(self, ticks: int = 1):
+        '''
+        Move every agent along its line for a number of translation intervals
+
+        Agents whose displacement changed or that were moved off their line since the last advance get a new anchor at
+        their position. Positions are always computed as anchor + steps * displacement, so advancing by n ticks at once
+        gives exactly the positions of n single advances
+        '''
+        displacements = self.displacements()
+        on_line = self.positions == self.anchor_positions + self.anchor_steps[:, np.newaxis] * self.anchor_displacements
+        reanchor = np.any(displacements != self.anchor_displacements, axis=1) | ~np.all(on_line, axis=1)
+        self.anchor_positions[reanchor] = self.positions[reanchor]
+        self.anchor_displacements[reanchor] = displacements[reanchor]
+        self.anchor_steps[reanchor] = 0
+        self.anchor_steps += ticks
+        self.positions[:] = self.anchor_positions + self.anchor_steps[:, np.newaxis] * self.anchor_displacements
+
+    def translate(self):
+        '''
+        Translate every agent that is not halted at its current velocity facing its titter
+        '''
+        self.reached_safety()
+        self.advance()
+
+    def apply_directives(self, agent_ids: np.ndarray, velocities: np.ndarray, titters: np.ndarray, directive_types: np.ndarray):
+        '''
+        Rotate the given agents to their new titters, adjust their velocities and update their states
+        '''
+        self.velocities[agent_ids] = velocities
+        self.titters[agent_ids] = titters
+        self.directive_types[agent_ids] = directive_types
+        for directive_type, state in DIRECTIVE_STATES.items():
+            self.states[agent_ids[directive_types == directive_type]] = state
@@ -0,0 +1,113 @@
+import os
+import json
+import hashlib
+import itertools
+import multiprocessing
+import numpy as np
+from swarm.params import Params, DEFAULTS
+from swarm.ensemble import Scenario, RESULT_DTYPE, run_scenario
+
+
+# one row of the sweep result table per (parameter point, scenario)
+SWEEP_DTYPE = np.dtype([('point', np.int64)] + [(name, np.float64) for name in DEFAULTS] + RESULT_DTYPE.descr)
+
+
+def grid_points(values: dict, base: Params = None) -> list:
+    '''
+    Returns every combination of the given parameter values, e.g. {'safety_radius': [0.3, 0.5], 'agent_radius': [1, 1.3]}.
+    Parameters not given keep their value in base
+    '''
+    base = base if base is not None else Params()
+    names = list(values)
+    return [base.replace(**dict(zip(names, combination))) for combination in itertools.product(*values.values())]
+
+
+def random_points(ranges: dict, count: int, seed: int = None, base: Params = None) -> list:
+    '''
+    Returns count parameter points drawn uniformly from the given (low, high) ranges, e.g. {'nominal_velocity': (0.1, 0.3)}.
+    Parameters not given keep their value in base
+    '''
+    base = base if base is not None else Params()
+    rng = np.random.default_rng(seed)
+    draws = {name: rng.uniform(low, high, count) for name, (low, high) in ranges.items()}
+    return [base.replace(**{name: float(draws[name][index]) for name in ranges}) for index in range(count)]
+
+
+def _seed_key(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return {'entropy': seed.entropy, 'spawn_key': list(seed.spawn_key)}
+    return seed
+
+
+def cache_key(scenario: Scenario) -> str:
+    '''
+    Returns the hash of everything that determines the result of a scenario: its parameters, seed and terrain
+    '''
+    description = {
+        'columns': RESULT_DTYPE.names, # cached rows are only valid for the result columns they were made for
+        'params': scenario.params.as_dict(),
+        'seed': _seed_key(scenario.seed),
+        'terrain': {
+            'width': scenario.width,
+            'height': scenario.height,
+            'obstacles': np.asarray(scenario.obstacles, dtype=float).reshape(-1, 4).tolist(),
+            'ticks': scenario.ticks,
+        },
+    }
+    return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+
+def _cached_row(path: str):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _run_point(job: tuple) -> tuple:
+    '''
+    Run one (point, scenario) job and store its result in the cache before returning it
+    '''
+    job_index, scenario, path = job
+    row = run_scenario((job_index, scenario))
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump([value.item() if isinstance(value, np.generic) else value for value in row], file)
+    os.replace(temporary_path, path) # an interrupted write never leaves a partial result behind
+    return job_index, row
+
+
+def run_sweep(points: list, scenarios: list, cache_directory: str, processes: int = None, chunksize: int = 1) -> np.ndarray:
+    '''
+    Run every scenario at every parameter point across a process pool -> result table (structured array ordered by point then scenario)
+
+    Each result is cached in cache_directory as soon as it is computed, so re-running a sweep only computes new points
+    and an interrupted sweep resumes where it stopped. The parameters of the scenarios are replaced by the points'
+    '''
+    os.makedirs(cache_directory, exist_ok=True)
+    rows = {}
+    pending = []
+    for point_index, params in enumerate(points):
+        for scenario_index, scenario in enumerate(scenarios):
+            job_index = point_index * len(scenarios) + scenario_index
+            scenario = Scenario(scenario.seed, scenario.obstacles, scenario.width, scenario.height, scenario.tick_limit, params)
+            path = os.path.join(cache_directory, cache_key(scenario) + '.json')
+            cached = _cached_row(path)
+            if cached is None:
+                pending.append((job_index, scenario, path))
+            else:
+                rows[job_index] = cached
+
+    if pending:
+        with multiprocessing.Pool(processes or os.cpu_count()) as pool:
+            for job_index, row in pool.imap_unordered(_run_point, pending, chunksize=chunksize):
+                rows[job_index] = row
+
+    results = np.empty(len(points) * len(scenarios), dtype=SWEEP_DTYPE)
+    for job_index in range(len(results)):
+        point_index, scenario_index = divmod(job_index, len(scenarios))
+        row = list(rows[job_index])
+        row[0] = scenario_index
+        results[job_index] = (point_index, *points[point_index].as_dict().values(), *row)
+    return results
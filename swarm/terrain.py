@@ -1,163 +1,246 @@
-import os
 import config as cf
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from swarm.agent import Agent
-from matplotlib.patches import Rectangle
+from swarm.state import SwarmState
+from swarm.obstacle_index import ObstacleIndex
+from swarm.neighbour_grid import NeighbourGrid
+from swarm.holes import HoleTable, HoleTableCache
+from swarm.params import Params
+from swarm.spawn import SPAWN_BAND_TOP, default_region, spawn_positions
+
+
+def random_obstacles(count: int, width: float, height: float, rng: np.random.Generator) -> list:
+    '''
+    Returns count random (x, y, dx, dy) obstacles clear of the spawn band at the bottom of the terrain
+    '''
+    return [(
+        float(rng.uniform(0, width - 2)), # x
+        float(rng.uniform(SPAWN_BAND_TOP, height - 5)), # y
+        float(rng.uniform(2, width / 4)), # dx
+        float(rng.uniform(2, 7)), # dy
+    ) for _ in range(count)]
 
 
 class Terrain:
     '''
     An obstacle course for the agents to traverse and conquer
     '''
-    def __init__(self, width: float, height: float, obstacles: list):
+    def __init__(self, width: float, height: float, obstacles: list, rng: np.random.Generator = None, agent_count: int = 5, params: Params = None,
+                 spawn_region: tuple = None, formation: str = 'random'):
         self.width = width
         self.height = height
-        self.agents = [Agent(i, self) for i in range(5)]
-        self.obstacles = obstacles
-
-        # create and configure plot
-        self.plot_figure = plt.figure(facecolor='white', figsize=(2, 2), dpi=300, frameon=True)
-        self.plot_axis = self.plot_figure.add_subplot()
-        self.plot_axis.set_ylim(0, self.height)
-        self.plot_axis.set_xlim(0, self.width)
-        self.plot_axis.yaxis.set_visible(False)
-        self.plot_axis.xaxis.set_visible(False)
-        self.plot_axis.spines['top'].set_visible(False)
-        self.plot_axis.spines['bottom'].set_visible(False)
-        self.plot_axis.set_facecolor('#8cc63f')
-
-    def plot_terrain(self, animation_index):
-        '''
-        Plot the obstacle course and agents
-        '''
-        for agent in self.agents:
-            agent.sense()
-        for agent in self.agents:
-            agent.translate()
-
-        # self.plot_axis.spines.clear()
-        for obstacle in self.obstacles:
-            x, y, dx, dy = obstacle
-            rectangle = Rectangle((x, y), dx, dy, fc='#764c29', ec='black', lw=0.484)
-            self.plot_axis.add_patch(rectangle)
-        
-        agents_x = []
-        agents_y = []
-        for agent in self.agents:
-            agents_x.append(agent.position[0])
-            agents_y.append(agent.position[1])
-        # print(agents_x)
-        if len(self.plot_axis.lines) > 1:
-            self.plot_axis.lines.pop(0)
-        agent_positions = self.plot_axis.plot(agents_x, agents_y, 'o', markersize= 2 * cf.AGENT_RADIUS, c='#2e3192')
-        # self.plot_axis.plot(3, 3, 'or', markersize=0.5)
-        # plt.show()
-        # agent_positions.set_data()
-        return agent_positions
-
-    def animate(self):
-        if not os.path.exists('output'):
-            os.makedirs('output')
-        anim = animation.FuncAnimation(self.plot_figure, self.plot_terrain, frames=200, interval=cf.TRANSLATION_INTERVAL * 1000, blit=True)
-        anim.save('output/swarm-control.mp4', writer = 'ffmpeg', fps = 20)
+        self.rng = rng if rng is not None else np.random.default_rng() # every random draw of the terrain and its agents
+        self.params = params if params is not None else Params()
+        self.bus = None # message bus the agents transmit distress on, if any
+        self.swarm = SwarmState(agent_count, self.params)
+        if spawn_region is None: # (x_min, y_min, x_max, y_max) of the agent centres
+            spawn_region = default_region(agent_count, width, self.params, formation)
+        self.swarm.positions[:] = spawn_positions(agent_count, spawn_region, self.params, formation, self.rng)
+        self._build(dict(enumerate(obstacles)), len(obstacles))
+
+    def _build(self, obstacles: dict, next_obstacle_id: int):
+        '''
+        Set up the agents and the indices over the swarm and the obstacles
+        '''
+        self.agents = [Agent(i, self) for i in range(self.swarm.size)]
+        self.neighbour_grid = NeighbourGrid(self.swarm)
+        self.obstacles = obstacles # obstacle id -> (x, y, dx, dy)
+        self.next_obstacle_id = next_obstacle_id
+        self.obstacle_index = ObstacleIndex(self.obstacles, self.params)
+        self.hole_tables = HoleTableCache()
+
+    def state(self) -> dict:
+        '''
+        Returns everything that determines how the terrain evolves: its size, parameters, random state, obstacles and swarm arrays.
+        The arrays are not copied
+        '''
+        state = {
+            'width': self.width,
+            'height': self.height,
+            'params': self.params.as_dict(),
+            'rng': self.rng.bit_generator.state,
+            'obstacle_ids': np.fromiter(self.obstacles.keys(), dtype=np.int64, count=len(self.obstacles)),
+            'obstacles': np.array(list(self.obstacles.values()), dtype=float).reshape(-1, 4),
+            'next_obstacle_id': self.next_obstacle_id,
+        }
+        state.update({name: getattr(self.swarm, name) for name in SwarmState.ARRAYS})
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict, params: Params = None) -> 'Terrain':
+        '''
+        Returns a terrain in the given state, optionally with other parameters
+        '''
+        terrain = cls.__new__(cls)
+        terrain.width = state['width']
+        terrain.height = state['height']
+        terrain.rng = np.random.Generator(getattr(np.random, state['rng']['bit_generator'])())
+        terrain.rng.bit_generator.state = state['rng']
+        terrain.params = params if params is not None else Params(**state['params'])
+        terrain.bus = None
+        terrain.swarm = SwarmState.from_arrays(state, terrain.params)
+        obstacles = dict(zip(np.asarray(state['obstacle_ids']).tolist(), map(tuple, np.asarray(state['obstacles']).tolist())))
+        terrain._build(obstacles, int(state['next_obstacle_id']))
+        return terrain
+
+    def fork(self, params: Params = None) -> 'Terrain':
+        '''
+        Returns an independent copy of the terrain that continues with the same random draws, optionally with other parameters
+        '''
+        return Terrain.from_state(self.state(), params)
+
+    def hole_table(self, obstacle_ids) -> HoleTable:
+        '''
+        Returns the (cached) openings between a set of obstacles
+        '''
+        obstacle_ids = tuple(sorted(int(obstacle_id) for obstacle_id in obstacle_ids))
+        return self.hole_tables.get(obstacle_ids, lambda: HoleTable([self.obstacles[obstacle_id] for obstacle_id in obstacle_ids], self.width))
+
+    def add_obstacle(self, obstacle: tuple) -> int:
+        '''
+        Place a new obstacle on the terrain. Returns its id
+        '''
+        return self.add_obstacles([obstacle])[0]
+
+    def add_obstacles(self, obstacles: list) -> list:
+        '''
+        Place new obstacles on the terrain. Returns their ids
+        '''
+        obstacle_ids = list(range(self.next_obstacle_id, self.next_obstacle_id + len(obstacles)))
+        self.next_obstacle_id += len(obstacles)
+        self.obstacles.update(zip(obstacle_ids, obstacles))
+        self.obstacle_index.add(obstacle_ids, obstacles)
+        return obstacle_ids
+
+    def move_obstacle(self, obstacle_id: int, obstacle: tuple):
+        '''
+        Replace an obstacle with one at a new place or of a new size
+        '''
+        self.obstacles[obstacle_id] = obstacle
+        self.obstacle_index.remove([obstacle_id])
+        self.obstacle_index.add([obstacle_id], [obstacle])
+        self.hole_tables.invalidate(obstacle_id)
+
+    def remove_obstacle(self, obstacle_id: int):
+        self.remove_obstacles([obstacle_id])
+
+    def remove_obstacles(self, obstacle_ids: list):
+        for obstacle_id in obstacle_ids:
+            del self.obstacles[obstacle_id]
+            self.hole_tables.invalidate(obstacle_id)
+        self.obstacle_index.remove(obstacle_ids)
 
     def receive_distress(self, sender_id: int, distress_data: dict):
         '''
         Receive distress signal from agent and transmit to concerned agents
         '''
-        distressed_agent_id = distress_data['agent_id']
-        in_safey_point_path_agents = distress_data['agents_in_sp_path'] # concerned agents
-
+        resolved = self.resolve_distress([distress_data])
         if distress_data['type'] == cf.DISTRESS_OBSTACLE_FOUND_SAFETY:
-            safety_point = distress_data['safety_point']
-            fastest_time = np.abs((self.agents[distressed_agent_id].position[0] - safety_point[0]) / cf.MAXIMUM_VELOCITY) + cf.SAFETY_RADIUS / cf.MAXIMUM_VELOCITY # time to cover horizontal and safety radius
-            if in_safey_point_path_agents:
-                if self.agents[in_safey_point_path_agents[0]].time_to_arrive(safety_point) > fastest_time: # distressed agent can reach safety point beofore others arrive
-                    time_to_safety = (self.agents[in_safey_point_path_agents[0]].time_to_arrive(safety_point) - fastest_time) / 2
-                    velocity_x_component = (self.agents[distressed_agent_id].position[0] - safety_point[0]) / time_to_safety # if vx is positive safety point is on the left. vice versa
-                    velocity_y_component = (safety_point[1] - self.agents[distressed_agent_id].position[1]) / time_to_safety # vy is always positive. because safety point is always ahead
-                    velocity_resultant = np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component))
-                    rotation_angle = np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi
-                    return {
-                        'ts': time_to_safety,
-                        'vx': velocity_x_component,
-                        'vy': velocity_y_component,
-                        'vr': velocity_resultant,
-                        'titter': rotation_angle,
-                }
-                elif len(in_safey_point_path_agents) == 1:
-                    time_to_safety = self.agents[in_safey_point_path_agents[0]].time_to_arrive(safety_point) + cf.SAFETY_RADIUS / cf.MAXIMUM_VELOCITY
-                    velocity_x_component = (self.agents[distressed_agent_id].position[0] - safety_point[0]) / time_to_safety # if vx is positive safety point is on the left. vice versa
-                    velocity_y_component = (safety_point[1] - self.agents[distressed_agent_id].position[1]) / time_to_safety # vy is always positive. because safety point is always ahead
-                    velocity_resultant = np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component))
-                    rotation_angle = np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi
-                    return {
-                        'ts': time_to_safety,
-                        'vx': velocity_x_component,
-                        'vy': velocity_y_component,
-                        'vr': velocity_resultant,
-                        'titter': rotation_angle,
-                }
-                else:
-                    gaps = []
-                    for agent_index in range(len(in_safey_point_path_agents) - 1):
-                        gap = self.agents[in_safey_point_path_agents[agent_index]].position[1] - self.agents[in_safey_point_path_agents[agent_index + 1]].position[1]
-                        gaps.append(gap)
-                    found_wide_enough_gap = False
-                    for gap_index in range(len(gaps)):
-                        if gaps[gap_index] > 2 * cf.AGENT_RADIUS + 2 * cf.OBSTACLE_ALLOWANCE:
-                            time_to_safety = self.agents[in_safey_point_path_agents[gap_index]].time_to_clear(safety_point) + (0.5 * gaps[gap_index]) / cf.NOMINAL_VELOCITY 
-                            found_wide_enough_gap = True
-                            break;
-
-                    if not found_wide_enough_gap:
-                        time_to_safety = self.agents[in_safey_point_path_agents[-1]].time_to_clear(safety_point)
-
-                    velocity_x_component = (self.agents[distressed_agent_id].position[0] - safety_point[0]) / time_to_safety # if vx is positive safety point is on the left. vice versa
-                    velocity_y_component = (safety_point[1] - self.agents[distressed_agent_id].position[1]) / time_to_safety # vy is always positive. because safety point is always ahead
-                    velocity_resultant = np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component))
-                    rotation_angle = np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi
-                    return {
-                        'ts': time_to_safety,
-                        'vx': velocity_x_component,
-                        'vy': velocity_y_component,
-                        'vr': velocity_resultant,
-                        'titter': rotation_angle,
-                } 
-            else:
-                time_to_safety = 0.75 * fastest_time
-                velocity_x_component = (self.agents[distressed_agent_id].position[0] - safety_point[0]) / time_to_safety # if vx is positive safety point is on the left. vice versa
-                velocity_y_component = (safety_point[1] - self.agents[distressed_agent_id].position[1]) / time_to_safety # vy is always positive. because safety point is always ahead
-                velocity_resultant = np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component))
-                rotation_angle = np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi
-                return {
-                    'ts': time_to_safety,
-                    'vx': velocity_x_component,
-                    'vy': velocity_y_component,
-                    'vr': velocity_resultant,
-                    'titter': rotation_angle,
-            }
-
-        elif distress_data['type'] == cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY:
-            for agent in self.agents:
-                if agent == self.agents[distressed_agent_id] or agent.position[1] > self.agents[distressed_agent_id].position[1]:
-                    continue
-                agent.velocity = 0
-            dx_from_terrain_center = self.agents[distressed_agent_id].position[0] - self.width / 2
-            search_direction = cf.SEARCH_DIRECTION_RIGHT if dx_from_terrain_center > 0 else cf.SEARCH_DIRECTION_LEFT
-            velocity_x_component = cf.MAXIMUM_VELOCITY * 0.3
-            velocity_y_component = 0
-            velocity_resultant = velocity_x_component # because no y component
-            rotation_angle = 0 if search_direction == cf.SEARCH_DIRECTION_RIGHT else 180
-            return {
-                'search_direction': search_direction,
-                'vx': velocity_x_component,
-                'vy': velocity_y_component,
-                'vr': velocity_resultant,
-                'titter': rotation_angle,
-            }
+            keys = ['ts', 'vx', 'vy', 'vr', 'titter']
+        else:
+            keys = ['search_direction', 'vx', 'vy', 'vr', 'titter']
+        return {key: resolved[key][0] for key in keys}
+
+    def resolve_distress(self, distress_messages: list) -> dict:
+        '''
+        Resolve every distress signal raised in a tick in one pass -> {directive field: array aligned with distress_messages}
+
+        Agents behind a distressed agent that found no safety point are halted before any directive is computed
+        '''
+        count = len(distress_messages)
+        agent_ids = np.array([distress_data['agent_id'] for distress_data in distress_messages], dtype=np.int64)
+        types = np.array([distress_data['type'] for distress_data in distress_messages], dtype=np.int64)
+        resolved = {
+            'agent_ids': agent_ids,
+            'halted': np.empty(0, dtype=np.int64),
+            'type': types,
+            'ts': np.full(count, np.nan),
+            'search_direction': np.zeros(count, dtype=np.int64),
+            'vx': np.zeros(count),
+            'vy': np.zeros(count),
+            'vr': np.zeros(count),
+            'titter': np.zeros(count),
+        }
+
+        not_found = np.flatnonzero(types == cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY)
+        if len(not_found):
+            # distressed agents are given directives of their own below, so only the others stay halted
+            resolved['halted'] = np.setdiff1d(self._halt_behind(agent_ids[not_found]), agent_ids)
+            dx_from_terrain_center = self.swarm.positions[agent_ids[not_found], 0] - self.width / 2
+            search_directions = np.where(dx_from_terrain_center > 0, cf.SEARCH_DIRECTION_RIGHT, cf.SEARCH_DIRECTION_LEFT)
+            resolved['search_direction'][not_found] = search_directions
+            resolved['vx'][not_found] = self.params.maximum_velocity * 0.3
+            resolved['vy'][not_found] = 0
+            resolved['vr'][not_found] = self.params.maximum_velocity * 0.3 # because no y component
+            resolved['titter'][not_found] = np.where(search_directions == cf.SEARCH_DIRECTION_RIGHT, 0, 180)
+
+        found = np.flatnonzero(types == cf.DISTRESS_OBSTACLE_FOUND_SAFETY)
+        if len(found):
+            safety_points = np.array([distress_messages[index]['safety_point'] for index in found], dtype=float).reshape(-1, 2)
+            in_path_agents = [distress_messages[index]['agents_in_sp_path'] for index in found] # concerned agents
+            time_to_safety = self._time_to_safety(agent_ids[found], safety_points, in_path_agents)
+            positions = self.swarm.positions[agent_ids[found]]
+            velocity_x_component = (positions[:, 0] - safety_points[:, 0]) / time_to_safety # if vx is positive safety point is on the left. vice versa
+            velocity_y_component = (safety_points[:, 1] - positions[:, 1]) / time_to_safety # vy is always positive. because safety point is always ahead
+            resolved['ts'][found] = time_to_safety
+            resolved['vx'][found] = velocity_x_component
+            resolved['vy'][found] = velocity_y_component
+            resolved['vr'][found] = np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component))
+            resolved['titter'][found] = np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi
+        return resolved
+
+    def _halt_behind(self, distressed_agent_ids: np.ndarray) -> np.ndarray:
+        '''
+        Halt every agent that is not ahead of some other distressed agent. Returns the ids of the agents that were not
+        halting already
+        '''
+        ys = self.swarm.positions[:, 1]
+        distressed_ys = np.full(self.swarm.size, -np.inf)
+        np.maximum.at(distressed_ys, distressed_agent_ids, ys[distressed_agent_ids])
+
+        # an agent only halts for distressed agents other than itself, so it compares against the runner-up if it leads
+        leaders = np.argsort(distressed_ys)[::-1][:2]
+        halt_below = np.full(self.swarm.size, distressed_ys[leaders[0]])
+        halt_below[leaders[0]] = distressed_ys[leaders[1]] if len(leaders) > 1 else -np.inf
+        halted = ys <= halt_below
+        newly_halted = np.flatnonzero(halted & (self.swarm.states != cf.HALTING))
+        self.swarm.velocities[halted] = 0
+        self.swarm.states[halted] = cf.HALTING
+        return newly_halted
+
+    def _time_to_safety(self, distressed_agent_ids: np.ndarray, safety_points: np.ndarray, in_path_agents: list) -> np.ndarray:
+        '''
+        Returns how long each distressed agent should take to reach its safety point without running into the agents in its path
+        '''
+        distressed_xs = self.swarm.positions[distressed_agent_ids, 0]
+        fastest_time = np.abs((distressed_xs - safety_points[:, 0]) / self.params.maximum_velocity) + self.params.safety_radius / self.params.maximum_velocity # time to cover horizontal and safety radius
+        time_to_safety = 0.75 * fastest_time
+
+        counts = np.array([len(agents) for agents in in_path_agents], dtype=np.int64)
+        with_path = np.flatnonzero(counts)
+        if not len(with_path):
+            return time_to_safety
+
+        first_arrival = self.swarm.time_to_arrive(np.array([in_path_agents[index][0] for index in with_path], dtype=np.int64), safety_points[with_path])
+        beats_first = first_arrival > fastest_time[with_path] # distressed agent can reach safety point beofore others arrive
+        time_to_safety[with_path[beats_first]] = (first_arrival[beats_first] - fastest_time[with_path[beats_first]]) / 2
+        single = ~beats_first & (counts[with_path] == 1)
+        time_to_safety[with_path[single]] = first_arrival[single] + self.params.safety_radius / self.params.maximum_velocity
+
+        # the rest wait for the first gap between in-path agents wide enough to pass through
+        queued = with_path[~beats_first & (counts[with_path] > 1)]
+        if len(queued):
+            owners = np.repeat(np.arange(len(queued)), counts[queued])
+            queued_agents = np.concatenate([in_path_agents[index] for index in queued]).astype(np.int64)
+            gaps = self.swarm.positions[queued_agents[:-1], 1] - self.swarm.positions[queued_agents[1:], 1]
+            wide_enough = (owners[:-1] == owners[1:]) & (gaps > 2 * self.params.agent_radius + 2 * self.params.obstacle_allowance)
+            clearing = np.cumsum(counts[queued]) - 1 # without a gap wait for the last in-path agent to clear
+            gap_owners, first_gaps = np.unique(owners[:-1][wide_enough], return_index=True)
+            clearing[gap_owners] = np.flatnonzero(wide_enough)[first_gaps]
+            time_to_clear = self.swarm.time_to_clear(queued_agents[clearing], safety_points[queued])
+            time_to_clear[gap_owners] += (0.5 * gaps[clearing[gap_owners]]) / self.params.nominal_velocity
+            time_to_safety[queued] = time_to_clear
+        return time_to_safety
 
     # def tester(self):
     #     print(self.agents[0].can_translate_on_x_axis_check())
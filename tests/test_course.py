@@ -0,0 +1,44 @@
+import numpy as np
+from swarm.course import write_course, TiledCourse, TileStreamer
+from swarm.terrain import Terrain, random_obstacles
+from swarm.simulation import Simulation
+
+
+def test_every_obstacle_belongs_to_a_tile(tmp_path):
+    obstacles = [(5, -3, 2, 2), (1, 0, 2, 2), (4, 150, 3, 3), (6, 299.5, 2, 2), (2, 320, 2, 2)]
+    write_course(str(tmp_path), obstacles, 20, 300, tile_height=100)
+    course = TiledCourse(str(tmp_path))
+    assert course.tile(0) == [(5, -3, 2, 2), (1, 0, 2, 2)]
+    assert course.tile(1) == [(4, 150, 3, 3)]
+    assert course.tile(2) == [(6, 299.5, 2, 2), (2, 320, 2, 2)]
+    assert sum(len(course.tile(tile_index)) for tile_index in range(len(course))) == len(obstacles)
+
+
+class ResidentTiles:
+    '''Observer recording the most tiles a streamer held at once'''
+    def __init__(self, streamer: TileStreamer):
+        self.streamer = streamer
+        self.peak = len(streamer.loaded)
+
+    def observe(self, simulation):
+        self.peak = max(self.peak, len(self.streamer.loaded))
+
+
+def test_streamed_runs_match_a_fully_loaded_course(tmp_path):
+    width, height, tile_height = 20, 3000, 100
+    for seed in range(4):
+        obstacles = random_obstacles(300, width, height, np.random.default_rng(seed))
+        write_course(str(tmp_path / str(seed)), obstacles, width, height, tile_height)
+        course = TiledCourse(str(tmp_path / str(seed)))
+        simulation = Simulation(Terrain(width, height, obstacles, rng=np.random.default_rng(seed + 100)))
+        simulation.run(1500)
+        for event_driven in (False, True):
+            terrain = course.terrain(rng=np.random.default_rng(seed + 100))
+            streamer = TileStreamer(terrain, course)
+            resident_tiles = ResidentTiles(streamer)
+            streamed = Simulation(terrain, observers=[streamer, resident_tiles])
+            streamed.run(1500, event_driven=event_driven)
+            np.testing.assert_array_equal(streamed.terrain.swarm.positions, simulation.terrain.swarm.positions)
+            assert streamed.distress_counts == simulation.distress_counts
+            tiles_per_agent = (streamer.lookbehind + streamer.lookahead) / tile_height + 2
+            assert resident_tiles.peak <= terrain.swarm.size * tiles_per_agent < len(course)
@@ -0,0 +1,54 @@
+import numpy as np
+from swarm.terrain import Terrain, random_obstacles
+from swarm.simulation import Simulation
+from swarm.metrics import SafetyMetrics
+
+
+class DenseMetrics:
+    '''SafetyMetrics computed from the full distance matrix and every agent-obstacle pair'''
+    def __init__(self, terrain):
+        self.terrain = terrain
+        self.totals = {'ticks': 0, 'min_separation': np.inf, 'min_separation_tick': None, 'collisions': 0, 'collision_ticks': 0,
+                       'near_misses': 0, 'near_miss_ticks': 0, 'obstacle_intrusions': 0, 'intrusion_ticks': 0}
+        self.colliding, self.near, self.intruding = set(), set(), set()
+
+    def observe(self, simulation):
+        params, positions = self.terrain.params, self.terrain.swarm.positions
+        contact_distance = 2 * params.agent_radius
+        with np.errstate(invalid='ignore'):
+            distances = np.sqrt(np.sum(np.square(positions[:, np.newaxis] - positions[np.newaxis]), axis=2))
+        firsts, seconds = np.triu_indices(len(positions), 1)
+        pair_distances = distances[firsts, seconds]
+        close = pair_distances < contact_distance + params.safety_radius
+        colliding = {(i, j) for i, j, distance in zip(firsts[close], seconds[close], pair_distances[close]) if distance < contact_distance}
+        near = {(i, j) for i, j in zip(firsts[close], seconds[close])} - colliding
+        if np.any(close) and pair_distances[close].min() < self.totals['min_separation']:
+            self.totals['min_separation'], self.totals['min_separation_tick'] = float(pair_distances[close].min()), simulation.tick
+
+        intruding = set()
+        for agent_id, (x, y) in enumerate(positions):
+            for obstacle_id, (left, bottom, dx, dy) in self.terrain.obstacles.items():
+                closest_x, closest_y = min(max(x, left), left + dx), min(max(y, bottom), bottom + dy)
+                if (x - closest_x) ** 2 + (y - closest_y) ** 2 < params.agent_radius ** 2:
+                    intruding.add((agent_id, obstacle_id))
+
+        self.totals['ticks'] += 1
+        for events, ticks, current, previous in (('collisions', 'collision_ticks', colliding, self.colliding),
+                                                 ('near_misses', 'near_miss_ticks', near, self.near),
+                                                 ('obstacle_intrusions', 'intrusion_ticks', intruding, self.intruding)):
+            self.totals[events] += len(current - previous)
+            self.totals[ticks] += len(current)
+        self.colliding, self.near, self.intruding = colliding, near, intruding
+
+
+def test_safety_metrics_match_dense_distances():
+    events = np.zeros(3, dtype=np.int64)
+    for seed in range(4):
+        rng = np.random.default_rng(seed)
+        terrain = Terrain(20, 150, random_obstacles(30, 20, 150, rng), rng=rng, agent_count=30)
+        metrics, dense = SafetyMetrics(terrain), DenseMetrics(terrain)
+        with np.errstate(all='ignore'):
+            Simulation(terrain, observers=[metrics, dense]).run(300)
+        assert metrics.summary() == dense.totals
+        events += (metrics.collisions, metrics.near_misses, metrics.obstacle_intrusions)
+    assert np.all(events > 0)
@@ -0,0 +1,46 @@
+import numpy as np
+from swarm.terrain import Terrain
+
+
+def seeded_terrain(seed: int = 0, agent_count: int = 300) -> Terrain:
+    rng = np.random.default_rng(seed)
+    terrain = Terrain(200, 400, [], rng=rng, agent_count=agent_count, spawn_region=(0, 0, 200, 400))
+    # integer ys give ties, which must keep id order
+    terrain.swarm.positions[::3, 1] = rng.integers(0, 40, len(terrain.swarm.positions[::3]))
+    terrain.neighbour_grid.rebuild()
+    return terrain
+
+
+def old_in_path_agents(agent) -> list:
+    '''The per-agent loop get_in_safety_point_path_agents replaced'''
+    in_path_agents = [other.id for other in agent.terrain.agents if other is not agent and other.in_path_check(agent.position)]
+    return list(sorted(in_path_agents, key=lambda agent_id: agent.terrain.agents[agent_id].position[1], reverse=True))
+
+
+def test_corridor_and_radius_match_scan():
+    terrain = seeded_terrain()
+    positions = terrain.swarm.positions
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        x, y = rng.uniform(0, 200), rng.uniform(0, 400)
+        half_width, radius = rng.uniform(0, 10), rng.uniform(0, 30)
+        in_corridor = (positions[:, 0] >= x - half_width) & (positions[:, 0] <= x + half_width)
+        assert terrain.neighbour_grid.corridor(x - half_width, x + half_width).tolist() == np.flatnonzero(in_corridor).tolist()
+        in_box = in_corridor & (positions[:, 1] >= y - half_width) & (positions[:, 1] <= y + half_width)
+        assert terrain.neighbour_grid.corridor(x - half_width, x + half_width, y - half_width, y + half_width).tolist() == np.flatnonzero(in_box).tolist()
+        in_radius = np.square(positions[:, 0] - x) + np.square(positions[:, 1] - y) <= np.square(radius)
+        assert terrain.neighbour_grid.radius((x, y), radius).tolist() == np.flatnonzero(in_radius).tolist()
+
+        # move some agents and check the grid follows them
+        moved = rng.choice(len(positions), 20, replace=False)
+        positions[moved] += rng.uniform(-20, 20, (20, 2))
+        terrain.neighbour_grid.update(moved)
+
+
+def test_in_path_agents_match_old_loop():
+    for seed in range(5):
+        terrain = seeded_terrain(seed)
+        old_terrain = terrain.fork()
+        for agent_id in np.random.default_rng(seed).choice(terrain.swarm.size, 20, replace=False):
+            assert terrain.agents[agent_id].get_in_safety_point_path_agents() == old_in_path_agents(old_terrain.agents[agent_id])
+            assert np.array_equal(terrain.swarm.positions, old_terrain.swarm.positions)
@@ -0,0 +1,135 @@
+import asyncio
+import numpy as np
+import pytest
+import config as cf
+from swarm.terrain import Terrain, random_obstacles
+from swarm.simulation import Simulation
+from swarm.events import ticks_to_next_event
+from swarm.instrumentation import Instrumentation, AggregateSink
+from swarm.message_bus import MessageBus, DISTRESS
+
+
+def seeded_simulation(seed: int, width: float = 20, height: float = 200, obstacle_count: int = 20) -> Simulation:
+    rng = np.random.default_rng(seed)
+    return Simulation(Terrain(width, height, random_obstacles(obstacle_count, width, height, rng), rng=rng))
+
+
+def test_positions_at_matches_ticks_within_skipped_stretch():
+    for seed in (0, 2, 3):
+        simulation = seeded_simulation(seed)
+        reference = simulation.fork()
+        ticks = ticks_to_next_event(simulation.terrain, 1000)
+        assert ticks > 1
+        simulation.skip(ticks)
+        for tick in range(ticks + 1):
+            np.testing.assert_array_equal(simulation.positions_at(tick), reference.terrain.swarm.positions)
+            reference.step()
+
+        with pytest.raises(ValueError):
+            simulation.positions_at(-1)
+        for _ in range(5):
+            simulation.step()
+        np.testing.assert_array_equal(simulation.positions_at(simulation.tick), simulation.terrain.swarm.positions)
+        for tick in range(ticks + 1, simulation.tick):
+            with pytest.raises(ValueError):
+                simulation.positions_at(tick) # stepped past the stretch, nothing to extrapolate from
+
+
+def test_halts_count_agents_brought_to_a_halt():
+    for seed in range(4):
+        simulation = seeded_simulation(seed, obstacle_count=40)
+        swarm = simulation.terrain.swarm
+        entries = 0
+        for _ in range(400):
+            halting = swarm.states == cf.HALTING
+            simulation.step()
+            entries += np.count_nonzero((swarm.states == cf.HALTING) & ~halting)
+        assert simulation.halts == entries
+
+
+def test_event_driven_run_matches_tick_run():
+    for seed in range(6):
+        simulation = seeded_simulation(seed, height=2000, obstacle_count=200)
+        sink = AggregateSink()
+        event_simulation = Simulation.from_state(simulation.state(), instrumentation=Instrumentation([sink]))
+        simulation.run(1500)
+        event_simulation.run(1500, event_driven=True)
+        assert event_simulation.tick == simulation.tick
+        assert sink.counters['skipped_ticks'] > 0
+        np.testing.assert_array_equal(event_simulation.terrain.swarm.positions, simulation.terrain.swarm.positions)
+        assert event_simulation.distress_counts == simulation.distress_counts
+
+
+def assert_same_run(simulation: Simulation, other: Simulation):
+    assert other.tick == simulation.tick
+    np.testing.assert_array_equal(other.terrain.swarm.positions, simulation.terrain.swarm.positions)
+    assert other.distress_counts == simulation.distress_counts
+    assert other.halts == simulation.halts
+
+
+@pytest.mark.parametrize('bit_generator', ['PCG64', 'PCG64DXSM', 'MT19937', 'Philox', 'SFC64'])
+def test_restored_and_forked_runs_continue_like_the_original(bit_generator):
+    rng = np.random.Generator(getattr(np.random, bit_generator)(7))
+    simulation = Simulation(Terrain(20, 300, random_obstacles(30, 20, 300, rng), rng=rng, agent_count=8))
+    simulation.run(60, event_driven=True)
+    restored = Simulation.restore(simulation.snapshot())
+    forked = simulation.fork()
+    for other in (restored, forked):
+        assert other.terrain.rng.bit_generator.state['bit_generator'] == bit_generator
+        assert other.cruise[:2] == simulation.cruise[:2]
+
+    for run in (simulation, restored, forked):
+        run.run(300)
+    for other in (restored, forked):
+        assert_same_run(simulation, other)
+    draws = simulation.terrain.rng.random(5)
+    for other in (restored, forked):
+        np.testing.assert_array_equal(other.terrain.rng.random(5), draws)
+
+
+def old_sense(terrain) -> list:
+    '''Every agent queried for blocking obstacles at its own turn, as before the batched query'''
+    swarm = terrain.swarm
+    swarm.directive_types[:] = cf.DISTRESS_NONE
+    distress_messages = []
+    for agent_id in np.flatnonzero(swarm.can_sense):
+        obstacle_ids = terrain.obstacle_index.blocking(swarm.positions[agent_id])
+        if len(obstacle_ids):
+            distress_messages.append(terrain.agents[agent_id].distress_data(obstacle_ids))
+    return distress_messages
+
+
+def test_sense_matches_querying_each_agent_at_its_turn():
+    pushed_ticks = 0
+    for seed in range(6):
+        rng = np.random.default_rng(seed)
+        simulation = Simulation(Terrain(20, 120, random_obstacles(25, 20, 120, rng), rng=rng, agent_count=20))
+        for _ in range(150):
+            sensing, reference = simulation.fork(), simulation.fork()
+            with np.errstate(all='ignore'):
+                distress_messages = sensing.sense()
+                expected = old_sense(reference.terrain)
+            assert len(distress_messages) == len(expected)
+            for distress_data, expected_data in zip(distress_messages, expected):
+                assert distress_data.keys() == expected_data.keys()
+                for key, value in expected_data.items():
+                    np.testing.assert_array_equal(distress_data[key], value)
+            np.testing.assert_array_equal(sensing.terrain.swarm.positions, reference.terrain.swarm.positions)
+            pushed_ticks += not np.array_equal(sensing.terrain.swarm.positions, simulation.terrain.swarm.positions)
+            simulation.step()
+    assert pushed_ticks # distress pushed agents mid-pass, so the re-query was exercised
+
+
+def test_zero_latency_bus_matches_step():
+    for seed in range(3):
+        simulation = seeded_simulation(seed)
+        bus_simulation = Simulation.from_state(simulation.state(), bus=MessageBus(rng=np.random.default_rng(seed)))
+        simulation.run(400)
+        asyncio.run(bus_simulation.run_async(400))
+        assert_same_run(simulation, bus_simulation)
+        assert bus_simulation.bus.delivered[DISTRESS] == sum(simulation.distress_counts.values()) > 0
+
+
+def test_step_async_needs_a_bus():
+    with pytest.raises(ValueError):
+        asyncio.run(seeded_simulation(0).step_async())
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from swarm.params import Params
+from swarm.spawn import SPAWN_BAND_TOP, FORMATIONS, spacing, default_region, spawn_positions
+from swarm.terrain import Terrain
+from util.exceptions import SpawnRegionError
+
+
+def min_pairwise_distance(positions: np.ndarray) -> float:
+    firsts, seconds = np.triu_indices(len(positions), 1)
+    return float(np.min(np.linalg.norm(positions[firsts] - positions[seconds], axis=1)))
+
+
+@pytest.mark.parametrize('formation', FORMATIONS)
+def test_spawned_agents_keep_their_spacing(formation):
+    rng = np.random.default_rng(0)
+    for params in (Params(), Params(agent_radius=0.4, safety_radius=0.2)):
+        for count in (2, 3, 7, 10, 36, 200):
+            width = 800 if formation in ('line', 'wedge') else 40 # a line or wedge of 200 agents is wider than a narrow terrain
+            region = default_region(count, width, params, formation)
+            positions = spawn_positions(count, region, params, formation, rng)
+            assert positions.shape == (count, 2)
+            assert min_pairwise_distance(positions) >= spacing(params) - 1e-9
+            x_min, y_min, x_max, y_max = region
+            assert np.all((positions >= (x_min - 1e-9, y_min - 1e-9)) & (positions <= (x_max + 1e-9, y_max + 1e-9)))
+
+
+def test_terrain_fits_any_formation_behind_the_spawn_band():
+    for formation in ('random', 'wedge', 'grid'):
+        terrain = Terrain(40, 100, [], rng=np.random.default_rng(0), agent_count=36, formation=formation)
+        assert min_pairwise_distance(terrain.swarm.positions) >= spacing(terrain.params) - 1e-9
+        assert terrain.swarm.positions[:, 1].max() <= SPAWN_BAND_TOP - terrain.params.agent_radius + 1e-9
+
+
+def test_too_many_agents_for_the_region():
+    with pytest.raises(SpawnRegionError):
+        spawn_positions(50, (0, 0, 20, 8), Params(), 'random', np.random.default_rng(0))
@@ -0,0 +1,85 @@
+import numpy as np
+import config as cf
+from swarm.terrain import Terrain
+
+
+def old_time_to(terrain, agent_id, destination, radius_sign):
+    '''Agent.time_to_arrive (radius_sign -1) and Agent.time_to_clear (+1) as they were per agent'''
+    (self_x, self_y), (destination_x, destination_y) = terrain.swarm.positions[agent_id], destination
+    distance_to_destination = np.sqrt(np.square(self_x - destination_x) - np.square(self_y - destination_y)) + radius_sign * cf.SAFETY_RADIUS
+    return distance_to_destination / terrain.swarm.velocities[agent_id]
+
+
+def old_receive_distress(terrain, distress_data) -> dict:
+    '''The per-message formulas resolve_distress replaced, without the halting'''
+    position = terrain.swarm.positions[distress_data['agent_id']]
+    in_path = distress_data['agents_in_sp_path']
+    if distress_data['type'] == cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY:
+        search_direction = cf.SEARCH_DIRECTION_RIGHT if position[0] - terrain.width / 2 > 0 else cf.SEARCH_DIRECTION_LEFT
+        return {'search_direction': search_direction, 'vx': cf.MAXIMUM_VELOCITY * 0.3, 'vy': 0, 'vr': cf.MAXIMUM_VELOCITY * 0.3,
+                'titter': 0 if search_direction == cf.SEARCH_DIRECTION_RIGHT else 180}
+
+    safety_point = distress_data['safety_point']
+    fastest_time = np.abs((position[0] - safety_point[0]) / cf.MAXIMUM_VELOCITY) + cf.SAFETY_RADIUS / cf.MAXIMUM_VELOCITY
+    if not in_path:
+        time_to_safety = 0.75 * fastest_time
+    elif old_time_to(terrain, in_path[0], safety_point, -1) > fastest_time:
+        time_to_safety = (old_time_to(terrain, in_path[0], safety_point, -1) - fastest_time) / 2
+    elif len(in_path) == 1:
+        time_to_safety = old_time_to(terrain, in_path[0], safety_point, -1) + cf.SAFETY_RADIUS / cf.MAXIMUM_VELOCITY
+    else:
+        gaps = [terrain.swarm.positions[in_path[index], 1] - terrain.swarm.positions[in_path[index + 1], 1] for index in range(len(in_path) - 1)]
+        time_to_safety = old_time_to(terrain, in_path[-1], safety_point, +1)
+        for gap_index, gap in enumerate(gaps):
+            if gap > 2 * cf.AGENT_RADIUS + 2 * cf.OBSTACLE_ALLOWANCE:
+                time_to_safety = old_time_to(terrain, in_path[gap_index], safety_point, +1) + (0.5 * gap) / cf.NOMINAL_VELOCITY
+                break
+    velocity_x_component = (position[0] - safety_point[0]) / time_to_safety
+    velocity_y_component = (safety_point[1] - position[1]) / time_to_safety
+    return {'ts': time_to_safety, 'vx': velocity_x_component, 'vy': velocity_y_component,
+            'vr': np.sqrt(np.square(velocity_x_component) + np.square(velocity_y_component)),
+            'titter': np.arctan(velocity_y_component / velocity_x_component) * 180 / np.pi}
+
+
+def distress_field(seed: int) -> tuple:
+    '''A terrain with random agent velocities and a tick's worth of random distress messages'''
+    rng = np.random.default_rng(seed)
+    terrain = Terrain(40, 100, [], rng=rng, agent_count=30, spawn_region=(0, 0, 40, 100))
+    terrain.swarm.velocities[:] = rng.uniform(0.1, cf.MAXIMUM_VELOCITY, terrain.swarm.size)
+    ys = terrain.swarm.positions[:, 1]
+    distress_messages = []
+    for agent_id in rng.choice(terrain.swarm.size, 8, replace=False):
+        others = np.setdiff1d(np.arange(terrain.swarm.size), [agent_id])
+        in_path = rng.choice(others, rng.integers(0, 5), replace=False)
+        distress_messages.append({
+            'agent_id': int(agent_id),
+            'type': int(rng.choice([cf.DISTRESS_OBSTACLE_FOUND_SAFETY, cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY], p=[0.7, 0.3])),
+            'safety_point': (float(rng.uniform(0, 40)), float(ys[agent_id] + rng.uniform(1, 10))),
+            'agents_in_sp_path': sorted(in_path.tolist(), key=lambda other_id: ys[other_id], reverse=True),
+        })
+    return terrain, distress_messages
+
+
+def test_resolve_distress_matches_per_message_formulas():
+    for seed in range(200):
+        terrain, distress_messages = distress_field(seed)
+        ys = terrain.swarm.positions[:, 1].copy()
+        velocities = terrain.swarm.velocities.copy()
+        halted = np.zeros(terrain.swarm.size, dtype=bool)
+        for distress_data in distress_messages:
+            if distress_data['type'] == cf.DISTRESS_OBSTACLE_NOT_FOUND_SAFETY: # every agent not ahead of the distressed one stops
+                behind = ys <= ys[distress_data['agent_id']]
+                behind[distress_data['agent_id']] = False
+                halted |= behind
+        reference = terrain.fork()
+        reference.swarm.velocities[halted] = 0
+        with np.errstate(all='ignore'): # random fields send agents to safety points they cannot reach
+            expected = [old_receive_distress(reference, distress_data) for distress_data in distress_messages]
+            resolved = terrain.resolve_distress(distress_messages)
+        np.testing.assert_array_equal(terrain.swarm.velocities, np.where(halted, 0, velocities))
+        assert np.all(terrain.swarm.states[halted] == cf.HALTING)
+        distressed_ids = [distress_data['agent_id'] for distress_data in distress_messages]
+        assert resolved['halted'].tolist() == np.setdiff1d(np.flatnonzero(halted), distressed_ids).tolist()
+        for index, directive in enumerate(expected):
+            for key, value in directive.items():
+                np.testing.assert_allclose(resolved[key][index], value, rtol=1e-12, err_msg=f'seed {seed} message {index} {key}')
@@ -1,4 +1,8 @@
 class VelocityDirectionError(Exception):
     def __init__(self, *args: object) -> None:
         super().__init__(*args)
-    
\ No newline at end of file
+    
+
+class SpawnRegionError(Exception):
+    def __init__(self, *args: object) -> None:
+        super().__init__(*args)